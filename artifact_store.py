@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+
+# === CONFIG ===
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR")                          # unset = store disabled
+ARTIFACT_STORE_MAX_MB = float(os.getenv("ARTIFACT_STORE_MAX_MB", "256"))
+ARTIFACT_STORE_MAX_AGE = float(os.getenv("ARTIFACT_STORE_MAX_AGE", "86400"))  # seconds
+ARTIFACT_STORE_SWEEP_INTERVAL = float(os.getenv("ARTIFACT_STORE_SWEEP_INTERVAL", "300"))  # seconds between expiry scans
+EVICT_HEADROOM = 0.1   # share of the cap an over-cap eviction frees beyond it, so scans stay rare when full
+
+
+def artifact_key(title: str, content, company_1: str, company_2: str, fmt: str) -> str:
+    """
+    Content address of a rendered export.
+
+    The rendered intro carries today's date, so the date is part of the key:
+    repeat downloads hit within a day, but never serve yesterday's date.
+    """
+    payload = json.dumps(
+        [title, content, company_1, company_2, fmt, datetime.today().strftime("%Y-%m-%d")],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Disk store of rendered documents keyed by `artifact_key`.
+
+    Files are written atomically. Writes keep a running total of the store's
+    size, so the directory is only scanned by `evict()` when a write takes the
+    total over `max_bytes`, or `sweep_interval` seconds after the last scan.
+    A scan drops entries older than `max_age`, then, if the store is over its
+    cap, the least recently used ones until it is EVICT_HEADROOM below it,
+    and resyncs the total with the disk. Reads
+    refresh an entry's mtime.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_age: float,
+                 sweep_interval: float = ARTIFACT_STORE_SWEEP_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._size = None          # bytes on disk, known after the first scan
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.sweeps = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.bin")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            due = (self._size is None or self._size > self.max_bytes
+                   or time.monotonic() - self._last_sweep > self.sweep_interval)
+        if due:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            self.sweeps += 1
+            self._last_sweep = time.monotonic()
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.root):
+                if not entry.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes if total <= self.max_bytes else int(self.max_bytes * (1 - EVICT_HEADROOM))
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+            self._size = total
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._size, "sweeps": self.sweeps}
+
+
+artifact_store = (
+    ArtifactStore(ARTIFACT_STORE_DIR, int(ARTIFACT_STORE_MAX_MB * 2 ** 20), ARTIFACT_STORE_MAX_AGE)
+    if ARTIFACT_STORE_DIR else None
+)
@@ -0,0 +1,106 @@
+"""
+Recall / latency / memory benchmark for the clause index factories.
+
+Builds each index type on a synthetic corpus of clustered, normalized
+embeddings (no model download needed) and compares it against exact search:
+
+    python benchmarks/bench_ann.py --n 100000 --factory "IVF1024,Flat" --factory HNSW32
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_indexer import make_index, prepare_vectors
+
+DEFAULT_FACTORIES = ["Flat", "IVF1024,Flat", "IVF1024,PQ48", "HNSW32"]
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 0):
+    """Clustered vectors roughly shaped like sentence embeddings of short clauses."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 100, 1), dim)).astype("float32")
+    corpus = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    queries = corpus[rng.integers(0, n, n_queries)] + 0.2 * rng.standard_normal((n_queries, dim)).astype("float32")
+    return prepare_vectors(corpus, "ip"), prepare_vectors(queries, "ip")
+
+
+def build(factory: str, corpus: np.ndarray, metric: str, train_size: int):
+    index = make_index(corpus.shape[1], factory, metric)
+    started = time.perf_counter()
+    if not index.is_trained:
+        sample = corpus[np.random.default_rng(1).choice(len(corpus), min(train_size, len(corpus)), replace=False)]
+        index.train(sample)
+    index.add_with_ids(corpus, np.arange(len(corpus), dtype="int64"))
+    return index, time.perf_counter() - started
+
+
+def evaluate(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    _, found = index.search(queries, k)
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        f"recall@{k}": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "memory_mb": round(len(faiss.serialize_index(index)) / 2 ** 20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000, help="corpus size (chunks)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--metric", choices=["l2", "ip"], default="ip")
+    parser.add_argument("--factory", action="append", help="FAISS factory string (repeatable)")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--train-size", type=int, default=50_000)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus, queries = synthetic_corpus(args.n, args.dim, args.queries)
+    print(f"📚 Synthetic corpus: {args.n} x {args.dim}, {args.queries} queries")
+
+    exact = make_index(args.dim, "Flat", args.metric)
+    exact.add_with_ids(corpus, np.arange(len(corpus), dtype="int64"))
+    _, truth = exact.search(queries, args.k)
+
+    results = []
+    for factory in args.factory or DEFAULT_FACTORIES:
+        index, build_s = build(factory, corpus, args.metric, args.train_size)
+        params = faiss.ParameterSpace()
+        for name, value in (("nprobe", args.nprobe), ("efSearch", args.ef_search)):
+            try:
+                params.set_index_parameter(index, name, value)
+            except RuntimeError:
+                pass
+        row = {"factory": factory, "build_s": round(build_s, 2), **evaluate(index, queries, truth, args.k)}
+        results.append(row)
+        print(json.dumps(row))
+
+    report = {
+        "benchmark": "ann",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
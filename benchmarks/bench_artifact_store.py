@@ -0,0 +1,103 @@
+"""
+Size-cap check and write throughput of the on-disk ArtifactStore.
+
+The check writes several times `--cap-kb` of artifacts into a fresh store and,
+after every write, sums the files on disk: the store must never exceed its cap
+and must keep the newest artifact. Then `put` is timed on a store already
+holding `--entries` files, with the running size total against a directory
+scan on every write (the old behaviour). The script exits 1 if the cap is
+ever exceeded:
+
+    python benchmarks/bench_artifact_store.py
+    python benchmarks/bench_artifact_store.py --entries 5000 --output artifacts.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from microbench import measure
+from artifact_store import ArtifactStore
+
+
+def disk_bytes(root: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(root) if entry.name.endswith(".bin"))
+
+
+def check_cap(root: str, cap: int, size: int) -> bool:
+    store = ArtifactStore(root, cap, max_age=3600, sweep_interval=3600)
+    worst = 0
+    for i in range(4 * cap // size):
+        store.put(f"artifact-{i}", os.urandom(size))
+        worst = max(worst, disk_bytes(root))
+        if store.get(f"artifact-{i}") is None:
+            print(f"❌ cap: artifact {i} was evicted by its own write")
+            return False
+    ok = worst <= cap
+    print(f"{'✅' if ok else '❌'} cap: at most {worst} bytes on disk for a {cap}-byte cap "
+          f"({store.sweeps} scans for {4 * cap // size} writes)")
+    return ok
+
+
+def bench_put(root: str, entries: int, size: int, repeat: int) -> list:
+    store = ArtifactStore(root, max_bytes=2 ** 40, max_age=3600, sweep_interval=3600)
+    for i in range(entries):
+        store.put(f"seed-{i}", os.urandom(size))
+    data, position = os.urandom(size), [0]
+
+    def put():
+        store.put(f"bench-{position[0]}", data)
+        position[0] += 1
+
+    def put_and_scan():
+        put()
+        store.evict()
+
+    return [
+        {"path": "scan_every_put", "entries": entries, **measure(put_and_scan, repeat)},
+        {"path": "running_total", "entries": entries, **measure(put, repeat)},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cap-kb", type=int, default=256, help="store cap for the eviction check")
+    parser.add_argument("--size-kb", type=int, default=24, help="artifact size")
+    parser.add_argument("--entries", type=int, default=2000, help="files already in the store when timing put")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="artifact_bench_")
+    try:
+        within_cap = check_cap(os.path.join(root, "cap"), args.cap_kb * 1024, args.size_kb * 1024)
+        results = bench_put(os.path.join(root, "put"), args.entries, 1024, args.repeat)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    for row in results:
+        print(json.dumps(row))
+    speedup = results[0]["median_ms"] / results[1]["median_ms"]
+    print(f"⚡ put with {args.entries} entries: {results[0]['per_sec']} -> {results[1]['per_sec']} writes/sec "
+          f"({speedup:.1f}x)")
+
+    report = {
+        "benchmark": "artifact_store",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "within_cap": within_cap,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    if not within_cap:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Equivalence check and throughput benchmark for DOCX export.
+
+Synthetic contracts are rendered by the python-docx reference (`build_docx`
+then save) and by the skeleton renderer (`render_docx`). Both outputs are
+read back and compared paragraph by paragraph on what a reader sees: text,
+line breaks, bold, font size, alignment, left indent and bullet numbering,
+resolved through the style chain. Then both paths are timed in documents/sec:
+
+    python benchmarks/bench_docx.py --pages 10,100
+    python benchmarks/bench_docx.py --repeat 20 --output docx.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from docx import Document
+from bench_formatter import synthetic_contract
+from microbench import measure
+from docx_exporter import build_docx, render_docx, _docx_skeleton
+from formatter import format_contract_with_sections
+
+ARGS = ("Non-Disclosure Agreement", "Acme Corp", "Globex LLC")
+
+
+def reference_docx(title: str, content, company_1: str, company_2: str) -> bytes:
+    buffer = BytesIO()
+    build_docx(title, content, company_1, company_2).save(buffer)
+    return buffer.getvalue()
+
+
+def _styles(paragraph):
+    style = paragraph.style
+    while style is not None:
+        yield style
+        style = style.base_style
+
+
+def _first(values):
+    return next((v for v in values if v is not None), None)
+
+
+def layout(data: bytes) -> list:
+    """One row per paragraph with its effective formatting."""
+    rows = []
+    for p in Document(BytesIO(data)).paragraphs:
+        styles = list(_styles(p))
+        runs = p.runs
+        size = _first([r.font.size for r in runs] + [s.font.size for s in styles])
+        rows.append({
+            "text": p.text,
+            "bold": bool(_first([r.bold for r in runs] + [s.font.bold for s in styles])),
+            "size_pt": size.pt if size is not None else None,
+            "align": _first([p.alignment] + [s.paragraph_format.alignment for s in styles]),
+            "left_indent": _first([p.paragraph_format.left_indent] + [s.paragraph_format.left_indent for s in styles]),
+            "bullet": _first([(p._p.xpath("./w:pPr/w:numPr/w:numId/@w:val") or [None])[0]] +
+                             [(s.element.xpath("./w:pPr/w:numPr/w:numId/@w:val") or [None])[0] for s in styles]),
+        })
+    return rows
+
+
+def check_equivalent(formatted: list, pages: int) -> bool:
+    reference, skeleton = layout(reference_docx(ARGS[0], formatted, *ARGS[1:])), layout(render_docx(ARGS[0], formatted, *ARGS[1:]))
+    mismatched = [i for i, (a, b) in enumerate(zip(reference, skeleton)) if a != b]
+    if len(reference) != len(skeleton):
+        print(f"❌ {pages} pages: {len(reference)} paragraphs in the reference, {len(skeleton)} from the skeleton")
+        return False
+    if mismatched:
+        i = mismatched[0]
+        print(f"❌ {pages} pages: {len(mismatched)} paragraphs differ, first #{i}: {reference[i]} != {skeleton[i]}")
+        return False
+    print(f"✅ {pages} pages: {len(reference)} paragraphs laid out identically")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,100", help="synthetic contract sizes")
+    parser.add_argument("--repeat", type=int, default=30, help="runs per size (scaled down for long contracts)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    args.pages = [int(p) for p in args.pages.split(",") if p.strip()]
+
+    started = time.perf_counter()
+    _docx_skeleton()
+    print(f"🦴 Skeleton built in {(time.perf_counter() - started) * 1000:.1f} ms (once per process)")
+
+    equivalent, results = True, []
+    for pages in args.pages:
+        formatted = format_contract_with_sections(synthetic_contract(pages), double_clean=True)[0]
+        equivalent &= check_equivalent(formatted, pages)
+        repeat = max(args.repeat * 10 // pages, 3)
+        rows = {
+            "reference": measure(lambda: reference_docx(ARGS[0], formatted, *ARGS[1:]), repeat),
+            "skeleton": measure(lambda: render_docx(ARGS[0], formatted, *ARGS[1:]), repeat),
+        }
+        for path, row in rows.items():
+            results.append({"path": path, "pages": pages, **row})
+            print(json.dumps(results[-1]))
+        speedup = rows["reference"]["median_ms"] / rows["skeleton"]["median_ms"]
+        print(f"⚡ {pages} pages: {rows['reference']['per_sec']} -> {rows['skeleton']['per_sec']} docs/sec ({speedup:.2f}x)")
+
+    report = {
+        "benchmark": "docx",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "equivalent": equivalent,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    if not equivalent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
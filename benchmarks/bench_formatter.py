@@ -0,0 +1,148 @@
+"""
+Golden-output check and microbenchmark for the contract formatter.
+
+Every input in benchmarks/formatter_golden/ is run through the single-pass
+engine (`format_contract_with_sections`) and compared byte for byte with the
+outputs recorded from the multi-pass reference pipeline. Then both paths are
+timed on a long synthetic contract:
+
+    python benchmarks/bench_formatter.py --pages 120
+    python benchmarks/bench_formatter.py --update-golden   # re-record from the reference pipeline
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from formatter import (clean_contract_text, format_contract_pipeline, format_sections,
+                       format_contract_with_sections)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "formatter_golden")
+LINES_PER_PAGE = 50
+
+
+def reference_outputs(text: str) -> dict:
+    """What the multi-pass pipeline produces for the preview and export paths."""
+    formatted = format_contract_pipeline(text)
+    return {
+        "formatted": formatted,
+        "sections": format_sections(formatted),
+        "export": format_contract_pipeline(clean_contract_text(text)),
+    }
+
+
+def engine_outputs(text: str) -> dict:
+    formatted, sections = format_contract_with_sections(text)
+    return {
+        "formatted": formatted,
+        "sections": sections,
+        "export": format_contract_with_sections(text, double_clean=True)[0],
+    }
+
+
+def golden_path(name: str) -> str:
+    return os.path.join(GOLDEN_DIR, "expected", f"{name}.json")
+
+
+def check_golden(update: bool) -> bool:
+    ok = True
+    os.makedirs(os.path.join(GOLDEN_DIR, "expected"), exist_ok=True)
+    for path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.txt"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            text = f.read()
+
+        if update:
+            with open(golden_path(name), "w", encoding="utf-8") as f:
+                json.dump(reference_outputs(text), f, indent=2, ensure_ascii=False)
+            print(f"💾 Recorded {name}")
+            continue
+
+        with open(golden_path(name), "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        got = engine_outputs(text)
+        mismatched = [key for key in expected if got[key] != expected[key]]
+        ok &= not mismatched
+        print(f"{'✅' if not mismatched else '❌'} {name}" + (f" (differs: {', '.join(mismatched)})" if mismatched else ""))
+    return ok
+
+
+def synthetic_contract(pages: int) -> str:
+    """A long, messy model-style contract: titles, bullets, subclauses, ragged whitespace."""
+    blocks = []
+    for n in range(pages * LINES_PER_PAGE // 10):
+        blocks.append("\n".join([
+            "CONFIDENTIAL INFORMATION" if n % 3 == 0 else f"SECTION {chr(65 + n % 26)} OBLIGATIONS",
+            f"The  Recipient shall protect clause {n}\tinformation —— with reasonable care.  ",
+            "- disclose only to employees with a need to know;",
+            "  •   keep records of every disclosure;",
+            "a. information already public;",
+            "b. information independently developed.",
+            "",
+            "",
+            f"Clause {n} survives termination of this Agreement for three (3) years.",
+        ]))
+    return "\n\n".join(blocks)
+
+
+def timed(fn, text: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        runs.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(runs), 3), "min_ms": round(min(runs), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=120, help="length of the synthetic contract")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--update-golden", action="store_true", help="re-record expected outputs and exit")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    golden_ok = check_golden(args.update_golden)
+    if args.update_golden:
+        return
+
+    text = synthetic_contract(args.pages)
+    if engine_outputs(text) != reference_outputs(text):
+        print("❌ Engine output differs from the reference pipeline on the synthetic contract")
+        golden_ok = False
+    print(f"📄 Synthetic contract: {args.pages} pages, {text.count(chr(10)) + 1} lines, {len(text)} chars")
+
+    paths = {
+        "preview_reference": lambda t: format_sections(format_contract_pipeline(t)),
+        "preview_engine": format_contract_with_sections,
+        "export_reference": lambda t: format_contract_pipeline(clean_contract_text(t)),
+        "export_engine": lambda t: format_contract_with_sections(t, double_clean=True),
+    }
+    results = {name: timed(fn, text, args.repeat) for name, fn in paths.items()}
+    for name, row in results.items():
+        print(json.dumps({"path": name, **row}))
+    for kind in ("preview", "export"):
+        speedup = results[f"{kind}_reference"]["median_ms"] / results[f"{kind}_engine"]["median_ms"]
+        print(f"⚡ {kind}: {speedup:.2f}x")
+
+    report = {
+        "benchmark": "formatter",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "golden_ok": golden_ok,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    if not golden_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Prompt size of the budgeted NDA prompt against the unbudgeted baseline.
+
+The baseline is what /generate-nda used to send: `nda_template` with the top 3
+retrieved clauses appended as-is. The budgeted prompt comes from
+`build_nda_prompt_within_budget` over PROMPT_CLAUSE_CANDIDATES retrieved
+clauses. Scopes are taken from the load-test corpus. The script exits 1 if a
+budgeted prompt is ever longer than its baseline, or not shorter on average:
+
+    python benchmarks/bench_prompt.py
+    python benchmarks/bench_prompt.py --max-prompt-tokens 900 --output prompt.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_utils import INDEX_PATH, METADATA_PATH, LEXICAL_PATH, ClauseRetriever
+from prompt_builder import (PROMPT_MAX_TOKENS, PROMPT_CLAUSE_CANDIDATES, count_message_tokens,
+                            build_nda_prompt_within_budget)
+from templates import nda_template
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_corpus.jsonl")
+BASELINE_TOP_K = 3
+
+
+def load_requests(path: str) -> list:
+    """Distinct NDA parameter sets from the load-test corpus."""
+    requests, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            params = json.loads(line).get("params") or {}
+            key = tuple(params.get(k) for k in ("company_1", "company_2", "scope", "jurisdiction"))
+            if params.get("scope") and key not in seen:
+                seen.add(key)
+                requests.append(params)
+    return requests
+
+
+def baseline_tokens(retriever: ClauseRetriever, params: dict) -> int:
+    clauses = retriever.search(params["scope"], BASELINE_TOP_K)
+    prompt = nda_template(params["company_1"], params["company_2"], params["scope"], params["jurisdiction"],
+                          params.get("effective_date"), "\n\n".join(c["text"] for c in clauses))
+    return count_message_tokens(prompt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--lexical", default=LEXICAL_PATH)
+    parser.add_argument("--corpus", default=CORPUS, help="JSONL requests with NDA params")
+    parser.add_argument("--max-prompt-tokens", type=int, default=PROMPT_MAX_TOKENS)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    requests = load_requests(args.corpus)
+    retriever = ClauseRetriever(args.index, args.metadata, lexical_path=args.lexical).warm_up()
+    print(f"📚 {len(requests)} requests, budget {args.max_prompt_tokens} tokens")
+
+    baseline, budgeted, dropped, longer = [], [], {}, 0
+    for params in requests:
+        clauses = retriever.search(params["scope"], PROMPT_CLAUSE_CANDIDATES)
+        plan = build_nda_prompt_within_budget(params["company_1"], params["company_2"], params["scope"],
+                                              params["jurisdiction"], params.get("effective_date"), clauses,
+                                              max_prompt_tokens=args.max_prompt_tokens)
+        baseline.append(baseline_tokens(retriever, params))
+        budgeted.append(plan["prompt_tokens"])
+        longer += budgeted[-1] > baseline[-1]
+        for reason, n in plan["clauses_dropped"].items():
+            dropped[reason] = dropped.get(reason, 0) + n
+
+    result = {
+        "requests": len(requests),
+        "baseline_mean_tokens": round(float(np.mean(baseline)), 1),
+        "budgeted_mean_tokens": round(float(np.mean(budgeted)), 1),
+        "budgeted_max_tokens": int(np.max(budgeted)),
+        "longer_than_baseline": longer,
+        "clauses_dropped": dropped,
+    }
+    print(json.dumps(result))
+    shorter = longer == 0 and result["budgeted_mean_tokens"] < result["baseline_mean_tokens"]
+    print(f"{'✅' if shorter else '❌'} prompt: {result['baseline_mean_tokens']} -> "
+          f"{result['budgeted_mean_tokens']} tokens on average, {longer} longer than baseline")
+
+    report = {
+        "benchmark": "prompt",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "shorter": shorter,
+        "result": result,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    if not shorter:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
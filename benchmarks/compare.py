@@ -0,0 +1,60 @@
+"""
+Compare two JSON result files written by the benchmarks' --output flag.
+
+Rows are matched by their identifying fields (suite, mode, pages,
+concurrency, ...), and each numeric field is printed with its change:
+
+    python benchmarks/compare.py baseline.json candidate.json
+    python benchmarks/compare.py baseline.json candidate.json --metric p95_ms --metric rps
+"""
+import json
+import argparse
+
+KEY_FIELDS = ("suite", "mode", "path", "format", "factory", "batch", "pages", "concurrency")
+
+
+def rows_by_key(report: dict) -> dict:
+    results = report.get("results", [])
+    if isinstance(results, dict):   # {name: {metric: value}} (bench_formatter)
+        results = [{"path": name, **row} for name, row in results.items()]
+    return {tuple((k, row[k]) for k in KEY_FIELDS if k in row): row for row in results}
+
+
+def numeric(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", action="append", help="only these fields (repeatable)")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+    if baseline.get("benchmark") != candidate.get("benchmark"):
+        print(f"⚠️ Comparing different benchmarks: {baseline.get('benchmark')} vs {candidate.get('benchmark')}")
+
+    before, after = rows_by_key(baseline), rows_by_key(candidate)
+    for key in [k for k in before if k in after]:
+        label = " ".join(f"{k}={v}" for k, v in key) or "(all)"
+        print(f"📊 {label}")
+        for field, old in before[key].items():
+            new = after[key].get(field)
+            if field in KEY_FIELDS or not numeric(old) or not numeric(new):
+                continue
+            if args.metric and field not in args.metric:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"    {field:<14} {old:>12g} -> {new:<12g} {change}")
+    for key in [k for k in before if k not in after]:
+        print(f"➖ only in baseline: {dict(key)}")
+    for key in [k for k in after if k not in before]:
+        print(f"➕ only in candidate: {dict(key)}")
+
+
+if __name__ == "__main__":
+    main()
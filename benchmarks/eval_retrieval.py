@@ -0,0 +1,123 @@
+"""
+Offline hit rate and latency of dense, lexical (BM25) and hybrid (RRF) retrieval.
+
+Queries come from a JSONL file ({"query": ..., "relevant": [clause ids]}) or,
+by default, are sampled from the indexed clauses themselves: a short word span
+of a clause is the query and that clause is the one relevant answer.
+
+Hybrid mode is also checked on off-topic queries, which must come back with
+fewer than k clauses (the script exits 1 otherwise).
+
+    python benchmarks/eval_retrieval.py --k 3
+    python benchmarks/eval_retrieval.py --queries labeled.jsonl --output eval.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_utils import INDEX_PATH, METADATA_PATH, LEXICAL_PATH, RETRIEVAL_MODES, ClauseRetriever
+from clause_store import load_entries
+
+
+def sample_queries(metadata_path: str, n: int, span: int, seed: int = 0) -> list:
+    clauses = load_entries(metadata_path)
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        clause = rng.choice(clauses)
+        words = clause["text"].split()
+        start = rng.randrange(max(len(words) - span, 0) + 1)
+        queries.append({"query": " ".join(words[start:start + span]), "relevant": [clause["id"]]})
+    return queries
+
+
+# No word in common with an NDA clause, and nothing an NDA is about.
+OFF_TOPIC_QUERIES = [
+    "quarterly sales forecast for frozen vegetables in Norway",
+    "recipe for sourdough bread with rye flour",
+    "football match highlights and player transfers",
+]
+
+
+def check_off_topic(retriever: ClauseRetriever, k: int) -> bool:
+    """Off-topic queries must not be padded up to k results in hybrid mode."""
+    ok = True
+    for query in OFF_TOPIC_QUERIES:
+        found = retriever.search(query, k, mode="hybrid")
+        ok &= len(found) < k
+        print(f"{'✅' if len(found) < k else '❌'} off-topic: {len(found)}/{k} results for {query!r}")
+    return ok
+
+
+def evaluate(retriever: ClauseRetriever, queries: list, mode: str, k: int) -> dict:
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for q in queries:
+        started = time.perf_counter()
+        found = [c["id"] for c in retriever.search(q["query"], k, mode=mode)]
+        latencies.append((time.perf_counter() - started) * 1000)
+        rank = next((i for i, clause_id in enumerate(found) if clause_id in q["relevant"]), None)
+        hits += rank is not None
+        reciprocal_ranks.append(0.0 if rank is None else 1.0 / (rank + 1))
+    return {
+        "mode": mode,
+        f"hit@{k}": round(hits / len(queries), 4),
+        f"mrr@{k}": round(float(np.mean(reciprocal_ranks)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--lexical", default=LEXICAL_PATH)
+    parser.add_argument("--queries", help="JSONL with query and relevant clause ids")
+    parser.add_argument("--samples", type=int, default=200, help="sampled queries when --queries is not given")
+    parser.add_argument("--span", type=int, default=8, help="words per sampled query")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.lexical):
+        sys.exit(f"❌ No BM25 index at {args.lexical}; run rag_indexer.py first")
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = sample_queries(args.metadata, args.samples, args.span)
+
+    retriever = ClauseRetriever(args.index, args.metadata, lexical_path=args.lexical).warm_up()
+    retriever.encoder.cache_size = 0   # measure real encodes, not cache hits
+    print(f"📚 {len(queries)} queries, k={args.k}")
+
+    results = []
+    for mode in RETRIEVAL_MODES:
+        row = evaluate(retriever, queries, mode, args.k)
+        results.append(row)
+        print(json.dumps(row))
+
+    off_topic_ok = check_off_topic(retriever, args.k) if retriever.resolve_mode("hybrid") == "hybrid" else True
+
+    report = {
+        "benchmark": "retrieval",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "off_topic_ok": off_topic_ok,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    if not off_topic_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load tests without a key.
+
+Serves POST /v1/chat/completions (plain and `stream=True`) with a canned NDA.
+The completion length follows the request's `max_tokens`, capped by
+--completion-tokens. Latency is time-to-first-token plus tokens / --tokens-per-sec,
+and --error-rate injects failures (429 with Retry-After by default):
+
+    python benchmarks/fake_llm.py --port 8900 --latency-ms 300 --tokens-per-sec 80 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=bench uvicorn main:app
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CLAUSES = [
+    ("CONFIDENTIALITY", "The Recipient shall hold all Confidential Information in strict confidence and shall not "
+                        "disclose it to any third party without the prior written consent of the Owner."),
+    ("DEFINITION OF CONFIDENTIAL INFORMATION", "Confidential Information means all non-public business, technical "
+                                              "and financial information disclosed by the Owner in any form."),
+    ("EXCLUSIONS", "Confidential Information does not include information that is or becomes public through no "
+                   "fault of the Recipient, or that the Recipient develops independently."),
+    ("TERM", "This Agreement remains in effect for two (2) years from the Effective Date, and the obligations of "
+             "confidentiality survive termination for three (3) years."),
+    ("RETURN OF MATERIALS", "Upon request the Recipient shall promptly return or destroy all materials containing "
+                            "Confidential Information and certify the destruction in writing."),
+    ("REMEDIES", "The Owner is entitled to injunctive relief for any breach, in addition to any other remedies "
+                 "available at law or in equity."),
+    ("GOVERNING LAW", "This Agreement is governed by the laws of the jurisdiction stated in the request, without "
+                      "regard to its conflict of laws principles."),
+]
+
+
+def contract_words(n_tokens: int) -> list:
+    """About `n_tokens` words of numbered clauses (one word is counted as one token)."""
+    words, number = [], 1
+    while len(words) < n_tokens:
+        title, body = CLAUSES[(number - 1) % len(CLAUSES)]
+        words += f"{number}. {title}\n".split(" ") + body.split(" ") + ["\n\n"]
+        number += 1
+    return words[:n_tokens]
+
+
+def create_app(latency_ms: float = 200, tokens_per_sec: float = 100, completion_tokens: int = 600,
+               error_rate: float = 0.0, error_status: int = 429, seed: int = None) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    stats = {"requests": 0, "streams": 0, "errors": 0, "completion_tokens": 0}
+
+    def error_response():
+        stats["errors"] += 1
+        headers = {"Retry-After": "1"} if error_status == 429 else {}
+        return JSONResponse(
+            {"error": {"message": "Injected failure", "type": "fake_llm_error", "code": error_status}},
+            status_code=error_status, headers=headers,
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if rng.random() < error_rate:
+            await asyncio.sleep(latency_ms / 1000 / 4)
+            return error_response()
+
+        n_tokens = min(body.get("max_tokens") or completion_tokens, completion_tokens)
+        words = contract_words(n_tokens)
+        stats["completion_tokens"] += len(words)
+        response_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency_ms / 1000 + len(words) / tokens_per_sec)
+            return {
+                "id": response_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)},
+            }
+
+        stats["streams"] += 1
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            payload = {"id": response_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await asyncio.sleep(latency_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            step = 4   # words per chunk
+            for i in range(0, len(words), step):
+                text = " ".join(words[i:i + step])
+                yield chunk({"content": text if i == 0 else " " + text})
+                await asyncio.sleep(step / tokens_per_sec)
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200, help="time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=100)
+    parser.add_argument("--completion-tokens", type=int, default=600, help="upper bound on completion length")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.latency_ms, args.tokens_per_sec, args.completion_tokens, args.error_rate,
+                     args.error_status, args.seed)
+    print(f"🤖 Fake LLM on http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
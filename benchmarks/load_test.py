@@ -0,0 +1,348 @@
+"""
+Load test for the API: replays a request corpus at several concurrency levels.
+
+By default it starts benchmarks/fake_llm.py and `uvicorn main:app` with
+--workers processes pointed at it, so no OpenAI key is needed. For each
+concurrency level it reports RPS, p50/p95/p99 latency (overall and per
+endpoint), errors, and CPU % / peak RSS of every server worker read from /proc:
+
+    python benchmarks/load_test.py --concurrency 1,8,32 --duration 20 --output load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --server-pid 4242   # existing server
+    python benchmarks/load_test.py --make-corpus 400                               # regenerate the corpus
+
+The generation cache is disabled (GENERATION_CACHE_SIZE=0) unless --cache is
+given, so every NDA request goes through the LLM path.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+CORPUS_PATH = os.path.join(BENCH_DIR, "load_corpus.jsonl")
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+COMPANIES = ["Acme Corp", "Globex LLC", "Initech Inc", "Umbrella Health", "Stark Industries", "Wayne Enterprises",
+             "Hooli", "Soylent Foods", "Tyrell Systems", "Cyberdyne Labs", "Vandelay Imports", "Wonka Industries"]
+SCOPES = ["software development", "clinical trial data", "merger negotiations", "supply chain pricing",
+          "marketing strategy", "source code escrow", "customer lists", "manufacturing processes",
+          "financial projections", "employee data", "governing law and jurisdiction", "termination notice"]
+JURISDICTIONS = ["USA", "Delaware", "California", "New York", "England and Wales", "India"]
+REVIEW_CLAUSES = [
+    "Either party may terminate this Agreement upon thirty (30) days written notice to the other party.",
+    "The Recipient shall keep all Confidential Information strictly confidential.",
+    "This Agreement shall be governed by the laws of the State of Delaware.",
+    "The Recipient may disclose information to its affiliates without restriction.",
+]
+# Endpoint mix of the generated corpus.
+MIX = (("/generate/nda", 0.4), ("/export/nda-docx", 0.2), ("/export/nda-pdf", 0.2), ("/api/review-clause", 0.2))
+
+
+# ─── Corpus ────────────────────
+def make_corpus(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    paths, weights = zip(*MIX)
+    corpus = []
+    for _ in range(n):
+        path = rng.choices(paths, weights)[0]
+        if path == "/api/review-clause":
+            if rng.random() < 0.5:
+                body = {"clause": rng.choice(REVIEW_CLAUSES)}
+            else:
+                body = {"clauses": rng.sample(REVIEW_CLAUSES, rng.randint(2, len(REVIEW_CLAUSES)))}
+            corpus.append({"method": "POST", "path": path, "json": body})
+        else:
+            company_1, company_2 = rng.sample(COMPANIES, 2)
+            corpus.append({"method": "GET", "path": path, "params": {
+                "company_1": company_1, "company_2": company_2, "scope": rng.choice(SCOPES),
+                "jurisdiction": rng.choice(JURISDICTIONS), "effective_date": f"2025-{rng.randint(1, 12):02d}-01",
+            }})
+    return corpus
+
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ─── /proc sampling ────────────
+def _children(pid: int) -> list:
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid and b"resource_tracker" not in cmdline:
+            found.append(int(entry))
+    return found
+
+
+def worker_pids(server_pid: int) -> list:
+    """uvicorn worker processes of a server (the server itself when it runs a single worker)."""
+    return _children(server_pid) or [server_pid]
+
+
+def read_proc(pid: int):
+    """(cpu seconds, rss MB) of a process, or None once it has exited."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # After the command name: state is field 0, utime/stime are 11/12, rss (pages) is 21.
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK, int(fields[21]) * PAGE_MB
+
+
+class ProcSampler:
+    """Polls /proc for each worker during a run: average CPU % and peak RSS."""
+
+    def __init__(self, pids: list, interval: float = 0.5):
+        self.pids = pids
+        self.interval = interval
+        self._start = {}
+        self._peak_rss = {}
+        self._task = None
+        self._started = 0.0
+
+    async def __aenter__(self):
+        self._started = time.perf_counter()
+        for pid in self.pids:
+            sample = read_proc(pid)
+            if sample:
+                self._start[pid] = sample[0]
+                self._peak_rss[pid] = sample[1]
+        self._task = asyncio.create_task(self._poll())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        self.elapsed = time.perf_counter() - self._started
+        self._end = {pid: read_proc(pid) for pid in self.pids}
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for pid in self.pids:
+                sample = read_proc(pid)
+                if sample:
+                    self._peak_rss[pid] = max(self._peak_rss.get(pid, 0.0), sample[1])
+
+    def report(self) -> list:
+        rows = []
+        for pid in self.pids:
+            end = self._end.get(pid)
+            if pid not in self._start or end is None:
+                continue
+            rows.append({
+                "pid": pid,
+                "cpu_percent": round(100 * (end[0] - self._start[pid]) / self.elapsed, 1),
+                "rss_mb_peak": round(max(self._peak_rss[pid], end[1]), 1),
+            })
+        return rows
+
+
+# ─── Driver ────────────────────
+def percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+async def run_level(client: httpx.AsyncClient, corpus: list, concurrency: int, duration: float,
+                    pids: list, offset: int = 0) -> tuple:
+    """
+    Replay the corpus from `offset` with `concurrency` clients for `duration` seconds.
+
+    Returns (results row, corpus position to continue from).
+    """
+    records = []   # (path, status, latency ms)
+    position = [offset]
+    deadline = time.perf_counter() + duration
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            entry = corpus[position[0] % len(corpus)]
+            position[0] += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(entry["method"], entry["path"], params=entry.get("params"),
+                                                json=entry.get("json"))
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            records.append((entry["path"], status, (time.perf_counter() - started) * 1000))
+
+    async with ProcSampler(pids) as sampler:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [latency for _, status, latency in records if status == 200]
+    by_endpoint = {}
+    for path in sorted({path for path, _, _ in records}):
+        rows = [(status, latency) for p, status, latency in records if p == path]
+        by_endpoint[path] = {
+            "requests": len(rows),
+            "errors": sum(status != 200 for status, _ in rows),
+            **percentiles([latency for status, latency in rows if status == 200]),
+        }
+    statuses = {}
+    for _, status, _ in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "rps": round(len(ok) / elapsed, 2),
+        **percentiles(ok),
+        "statuses": statuses,
+        "by_endpoint": by_endpoint,
+        "workers": sampler.report(),
+    }, position[0]
+
+
+async def wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not become ready in {timeout:g}s")
+
+
+def start_servers(args) -> tuple:
+    """Start the fake LLM (unless --llm-url) and uvicorn main:app; returns (processes, app url, server pid)."""
+    processes = []
+    llm_url = args.llm_url
+    if not llm_url:
+        processes.append(subprocess.Popen([
+            sys.executable, os.path.join(BENCH_DIR, "fake_llm.py"), "--port", str(args.llm_port),
+            "--latency-ms", str(args.llm_latency_ms), "--tokens-per-sec", str(args.llm_tokens_per_sec),
+            "--completion-tokens", str(args.llm_completion_tokens), "--error-rate", str(args.llm_error_rate),
+        ]))
+        llm_url = f"http://127.0.0.1:{args.llm_port}/v1"
+
+    scratch = tempfile.mkdtemp(prefix="accordly_load_")
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": llm_url,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"),
+        "JOB_DB_PATH": os.path.join(scratch, "jobs.sqlite3"),
+        "TEXT_CACHE_DIR": os.path.join(scratch, "text_cache"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    if not args.cache:
+        env["GENERATION_CACHE_SIZE"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        cwd=REPO_DIR, env=env,
+    )
+    processes.append(server)
+    return processes, f"http://127.0.0.1:{args.port}", server.pid
+
+
+def stop_servers(processes: list):
+    for process in processes:
+        process.send_signal(signal.SIGINT)
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def run(args) -> dict:
+    corpus = load_corpus(args.corpus)
+    processes, url, server_pid = ([], args.url, args.server_pid) if args.url else start_servers(args)
+    try:
+        await wait_ready(f"{url}/", args.startup_timeout)
+        if args.llm_url is None and not args.url:
+            await wait_ready(f"http://127.0.0.1:{args.llm_port}/stats", args.startup_timeout)
+        pids = worker_pids(server_pid) if server_pid else []
+        print(f"🎯 {url} ({len(pids)} worker(s) sampled), corpus of {len(corpus)} requests")
+
+        levels, offset = [], 0
+        timeout = httpx.Timeout(args.request_timeout)
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+            if args.warmup:
+                await run_level(client, corpus, min(args.concurrency), args.warmup, [])
+            for concurrency in args.concurrency:
+                row, offset = await run_level(client, corpus, concurrency, args.duration, pids, offset)
+                levels.append(row)
+                print(json.dumps({k: v for k, v in row.items() if k != "by_endpoint"}))
+        return {
+            "benchmark": "load",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "results": levels,
+        }
+    finally:
+        stop_servers(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--make-corpus", type=int, metavar="N", help="write N generated requests to --corpus and exit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unrecorded traffic first")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--url", help="target an already-running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="with --url: uvicorn process to sample CPU/RSS from")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--cache", action="store_true", help="keep the generation cache enabled")
+    parser.add_argument("--llm-url", help="use this OpenAI-compatible base URL instead of the fake LLM")
+    parser.add_argument("--llm-port", type=int, default=8900)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=400)
+    parser.add_argument("--llm-completion-tokens", type=int, default=600)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.make_corpus:
+        with open(args.corpus, "w", encoding="utf-8") as f:
+            for entry in make_corpus(args.make_corpus, args.seed):
+                f.write(json.dumps(entry) + "\n")
+        print(f"💾 Wrote {args.make_corpus} requests to {args.corpus}")
+        return
+
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Offline microbenchmarks for the CPU-bound pieces of the NDA pipeline.
+
+No server or LLM is involved:
+
+- retrieval: `search_batch` latency per retrieval mode on the committed index
+  (the embedding model must already be in the local cache).
+- formatter: `format_contract_with_sections` on synthetic contracts.
+- render: DOCX and PDF rendering of the formatted contracts, in documents/sec.
+
+    python benchmarks/microbench.py --output micro.json
+    python benchmarks/microbench.py --only formatter,render --pages 10,100
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_formatter import synthetic_contract
+from eval_retrieval import sample_queries
+from formatter import format_contract_with_sections
+
+SUITES = ("retrieval", "formatter", "render")
+
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    runs.sort()
+    return {
+        "median_ms": round(statistics.median(runs), 3),
+        "p95_ms": round(runs[min(int(0.95 * len(runs)), len(runs) - 1)], 3),
+        "min_ms": round(runs[0], 3),
+        "per_sec": round(1000 / statistics.median(runs), 2),
+    }
+
+
+def bench_retrieval(args) -> list:
+    from rag_utils import METADATA_PATH, RETRIEVAL_MODES, ClauseRetriever
+
+    retriever = ClauseRetriever().warm_up()
+    retriever.encoder.cache_size = 0   # measure real encodes, not cache hits
+    queries = [q["query"] for q in sample_queries(METADATA_PATH, args.queries, 8)]
+    rows = []
+    for mode in RETRIEVAL_MODES:
+        for batch in (1, 16):
+            chunks = [queries[i:i + batch] for i in range(0, len(queries), batch)]
+            position = [0]
+
+            def search():
+                retriever.search_batch(chunks[position[0] % len(chunks)], 5, mode=mode)
+                position[0] += 1
+
+            rows.append({"suite": "retrieval", "mode": retriever.resolve_mode(mode), "batch": batch,
+                         **measure(search, args.repeat)})
+    return rows
+
+
+def bench_formatter(args) -> list:
+    rows = []
+    for pages in args.pages:
+        text = synthetic_contract(pages)
+        rows.append({"suite": "formatter", "pages": pages,
+                     **measure(lambda: format_contract_with_sections(text, double_clean=True), args.repeat)})
+    return rows
+
+
+def bench_render(args) -> list:
+    from docx_exporter import render_docx, render_pdf
+
+    rows = []
+    for pages in args.pages:
+        formatted = format_contract_with_sections(synthetic_contract(pages), double_clean=True)[0]
+        for fmt, render in (("docx", render_docx), ("pdf", render_pdf)):
+            rows.append({"suite": "render", "format": fmt, "pages": pages,
+                         **measure(lambda: render("Non-Disclosure Agreement", formatted, "Acme Corp", "Globex LLC"),
+                                   max(args.repeat // pages, 3))})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(SUITES), help="comma-separated suites to run")
+    parser.add_argument("--pages", default="10,100", help="synthetic contract sizes")
+    parser.add_argument("--queries", type=int, default=200, help="sampled retrieval queries")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    args.pages = [int(p) for p in args.pages.split(",") if p.strip()]
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        sys.exit(f"❌ Unknown suites: {', '.join(unknown)} (choose from {', '.join(SUITES)})")
+
+    runners = {"retrieval": bench_retrieval, "formatter": bench_formatter, "render": bench_render}
+    results = []
+    for suite in suites:
+        for row in runners[suite](args):
+            results.append(row)
+            print(json.dumps(row))
+
+    report = {
+        "benchmark": "micro",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
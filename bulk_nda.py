@@ -0,0 +1,177 @@
+import os
+import io
+import re
+import csv
+import json
+import asyncio
+import argparse
+import zipfile
+
+from gpt_utils import agenerate_contract
+from prompt_builder import PROMPT_CLAUSE_CANDIDATES, aget_encoding, build_nda_prompt_within_budget, usage_report
+from formatter import format_contract_with_sections
+from rag_utils import retriever
+from nda_pipeline import TITLE, EXPORT_FORMATS, render_export
+
+# === CONFIG ===
+BULK_LLM_CONCURRENCY = int(os.getenv("BULK_LLM_CONCURRENCY", "4"))   # concurrent LLM calls per bulk run
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "500"))
+REQUIRED_FIELDS = ("company_1", "company_2", "scope")
+FIELDS = REQUIRED_FIELDS + ("jurisdiction", "effective_date")
+
+
+def parse_rows(data: bytes, filename: str = "") -> list:
+    """Parse a CSV or JSONL upload into NDA row dicts (JSONL if the name ends in .jsonl/.ndjson)."""
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        rows = []
+        for line_number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {line_number} is not valid JSON: {e}")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_number} is not a JSON object")
+            rows.append(row)
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    if len(rows) > BULK_MAX_ROWS:
+        raise ValueError(f"Too many rows ({len(rows)} > {BULK_MAX_ROWS})")
+
+    parsed = []
+    for number, row in enumerate(rows, 1):
+        row = {k: (str(row.get(k) or "").strip() or None) for k in FIELDS}
+        missing = [k for k in REQUIRED_FIELDS if not row[k]]
+        if missing:
+            raise ValueError(f"Row {number} is missing {', '.join(missing)}")
+        row["jurisdiction"] = row["jurisdiction"] or "USA"
+        parsed.append(row)
+    return parsed
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", text).strip("-")[:40] or "party"
+
+
+class _ZipSink:
+    """Write-only, non-seekable sink: zipfile streams entries into it and we drain the bytes."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def _generate_row(number: int, row: dict, rag_clauses: list, llm_slots: asyncio.Semaphore, formats: list):
+    try:
+        await aget_encoding()
+        plan = build_nda_prompt_within_budget(row["company_1"], row["company_2"], row["scope"], row["jurisdiction"],
+                                              row["effective_date"], rag_clauses)
+        async with llm_slots:
+            raw_output = await agenerate_contract(plan["prompt"], max_tokens=plan["max_tokens"], priority="batch")
+        formatted_output = format_contract_with_sections(raw_output, double_clean=True)[0]
+        files = {}
+        for fmt in formats:
+            files[fmt] = await render_export(fmt, TITLE, formatted_output, row["company_1"], row["company_2"])
+        return number, row, files, None, usage_report(plan, raw_output)
+    except Exception as e:
+        return number, row, {}, str(e), None
+
+
+async def retrieve_scopes(rows: list) -> dict:
+    """Retrieved clauses for each distinct scope in `rows`, from one batched search."""
+    scopes = sorted({row["scope"] for row in rows})
+    results = await asyncio.to_thread(retriever.search_batch, scopes, PROMPT_CLAUSE_CANDIDATES)
+    return dict(zip(scopes, results))
+
+
+async def stream_bulk_zip(rows: list, rag_by_scope: dict, formats: list = ("docx",),
+                          concurrency: int = BULK_LLM_CONCURRENCY):
+    """
+    Generate an NDA per row and yield a ZIP archive as it is built.
+
+    `rag_by_scope` comes from `retrieve_scopes`, so callers can retrieve (and
+    fail) before a response is started. Generations run concurrently, with at
+    most `concurrency` LLM calls in flight, and each document is compressed
+    into the archive in a worker thread and released as soon as it is ready.
+    A manifest.json with per-row status is written last.
+    """
+    for fmt in formats:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+
+    llm_slots = asyncio.Semaphore(concurrency)
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    manifest = []
+
+    # Keep a bounded window of rows in flight so finished documents never pile up.
+    pending = set()
+    queue = iter(enumerate(rows, 1))
+    window = concurrency * 2
+    try:
+        while True:
+            for number, row in queue:
+                pending.add(asyncio.ensure_future(
+                    _generate_row(number, row, rag_by_scope[row["scope"]], llm_slots, formats)))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                number, row, files, error, usage = task.result()
+                entry = {"row": number, **row, "status": "failed" if error else "succeeded", "error": error,
+                         "usage": usage, "files": []}
+                for fmt, data in files.items():
+                    name = f"{number:04d}_{_slug(row['company_1'])}_{_slug(row['company_2'])}.{fmt}"
+                    await asyncio.to_thread(archive.writestr, name, data)
+                    entry["files"].append(name)
+                manifest.append(entry)
+                yield sink.drain()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    manifest.sort(key=lambda e: e["row"])
+    await asyncio.to_thread(archive.writestr, "manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+    archive.close()
+    yield sink.drain()
+
+
+async def _run_cli(input_path: str, output_path: str, formats: list, concurrency: int):
+    with open(input_path, "rb") as f:
+        rows = parse_rows(f.read(), input_path)
+    with open(output_path, "wb") as out:
+        async for chunk in stream_bulk_zip(rows, await retrieve_scopes(rows), formats, concurrency):
+            out.write(chunk)
+    print(f"✅ Wrote {len(rows)} NDAs to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate NDAs in bulk from a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV/JSONL with company_1, company_2, scope, jurisdiction, effective_date")
+    parser.add_argument("-o", "--output", default="ndas.zip")
+    parser.add_argument("--formats", default="docx", help="comma-separated: docx,pdf")
+    parser.add_argument("--concurrency", type=int, default=BULK_LLM_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(_run_cli(args.input, args.output, args.formats.split(","), args.concurrency))
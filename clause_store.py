@@ -0,0 +1,250 @@
+import os
+import json
+import mmap
+import stat
+import struct
+import argparse
+import tempfile
+import numpy as np
+
+MAGIC = b"CLAUSES1"
+_HEADER_LEN = struct.Struct("<I")
+_ALIGN = 8
+
+# Sections in file order: (name, dtype)
+_SECTIONS = (
+    ("slots", "int32"),          # faiss_id -> record position, -1 for unused ids
+    ("faiss_ids", "int64"),
+    ("id_offsets", "int64"),     # record i's "id" is id_blob[id_offsets[i]:id_offsets[i + 1]]
+    ("text_offsets", "int64"),
+    ("id_blob", "uint8"),
+    ("text_blob", "uint8"),
+)
+
+
+# === CLAUSE STORE ===
+class ClauseStore:
+    """
+    Read-only clause metadata in one memory-mapped file.
+
+    Texts live in a UTF-8 blob addressed by an offsets array, and a dense
+    `slots` array maps FAISS ids to records, so `store[faiss_id]` is O(1) and
+    decodes only that clause. Pages are shared between worker processes
+    through the OS page cache. Lookups return the same dicts the JSON
+    metadata held: {"faiss_id", "id", "text"}.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a clause store: {path}")
+        (header_len,) = _HEADER_LEN.unpack_from(self._mm, len(MAGIC))
+        start = len(MAGIC) + _HEADER_LEN.size
+        header = json.loads(self._mm[start:start + header_len].decode("utf-8"))
+        for name, dtype in _SECTIONS:
+            offset, count = header["sections"][name]
+            setattr(self, f"_{name}", np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset))
+
+    def __len__(self) -> int:
+        return len(self._faiss_ids)
+
+    def _position(self, faiss_id) -> int:
+        if not 0 <= faiss_id < len(self._slots):
+            return -1
+        return int(self._slots[faiss_id])
+
+    def __contains__(self, faiss_id) -> bool:
+        return self._position(faiss_id) >= 0
+
+    def __getitem__(self, faiss_id) -> dict:
+        position = self._position(faiss_id)
+        if position < 0:
+            raise KeyError(faiss_id)
+        return self._record(position)
+
+    def get(self, faiss_id, default=None):
+        position = self._position(faiss_id)
+        return self._record(position) if position >= 0 else default
+
+    def text(self, faiss_id) -> str:
+        position = self._position(faiss_id)
+        if position < 0:
+            raise KeyError(faiss_id)
+        return self._slice(self._text_blob, self._text_offsets, position)
+
+    def __iter__(self):
+        return (int(i) for i in self._faiss_ids)
+
+    def entries(self):
+        """All records in FAISS id order, decoded one at a time."""
+        return (self._record(position) for position in range(len(self)))
+
+    def _record(self, position: int) -> dict:
+        return {
+            "faiss_id": int(self._faiss_ids[position]),
+            "id": self._slice(self._id_blob, self._id_offsets, position),
+            "text": self._slice(self._text_blob, self._text_offsets, position),
+        }
+
+    @staticmethod
+    def _slice(blob: np.ndarray, offsets: np.ndarray, position: int) -> str:
+        return blob[offsets[position]:offsets[position + 1]].tobytes().decode("utf-8")
+
+
+class TextSpool:
+    """
+    Texts appended to an anonymous temp file (deleted on close or exit).
+
+    Only (offset, length) per key stays in memory, so large corpora can be
+    carried between build steps without holding their text.
+    """
+
+    def __init__(self, directory: str = None):
+        self._file = tempfile.TemporaryFile(dir=directory, prefix=".tmp_spool_")
+        self._spans = {}
+        self._end = 0
+
+    def add(self, key, text: str):
+        data = text.encode("utf-8")
+        self._file.seek(self._end)
+        self._file.write(data)
+        self._spans[key] = (self._end, len(data))
+        self._end += len(data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._spans
+
+    def discard(self, key):
+        self._spans.pop(key, None)
+
+    def length(self, key) -> int:
+        return self._spans[key][1]
+
+    def read_bytes(self, key) -> bytes:
+        offset, length = self._spans[key]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def text(self, key) -> str:
+        return self.read_bytes(key).decode("utf-8")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_clause_store(path: str, entries):
+    """
+    Write clause metadata entries as a store, atomically.
+
+    `entries` may be any iterable, e.g. a generator over a larger-than-memory
+    corpus: texts are spooled to disk on the way, so only ids and offsets are
+    held. Entries without "faiss_id" (older positional metadata) use their position.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with TextSpool(directory) as spool:
+        ids = {}
+        for pos, e in enumerate(entries):
+            faiss_id = e.get("faiss_id", pos)
+            ids[faiss_id] = e["id"].encode("utf-8")
+            spool.add(faiss_id, e["text"])
+        order = sorted(ids)
+
+        faiss_ids = np.array(order, dtype="int64")
+        slots = np.full(int(faiss_ids.max()) + 1 if len(faiss_ids) else 0, -1, dtype="int32")
+        slots[faiss_ids] = np.arange(len(order), dtype="int32")
+        text_offsets = np.zeros(len(order) + 1, dtype="int64")
+        np.cumsum([spool.length(i) for i in order], out=text_offsets[1:])
+        arrays = {
+            "slots": slots,
+            "faiss_ids": faiss_ids,
+            "id_offsets": np.concatenate([[0], np.cumsum([len(ids[i]) for i in order])]).astype("int64"),
+            "text_offsets": text_offsets,
+            "id_blob": np.frombuffer(b"".join(ids[i] for i in order), dtype="uint8"),
+        }
+        sizes = {name: (len(array), array.nbytes) for name, array in arrays.items()}
+        sizes["text_blob"] = (int(text_offsets[-1]), int(text_offsets[-1]))
+
+        # The header holds absolute section offsets, which depend on the header's own length.
+        header_len = 256
+        while True:
+            offset = _aligned(len(MAGIC) + _HEADER_LEN.size + header_len)
+            sections = {}
+            for name, _ in _SECTIONS:
+                sections[name] = [offset, sizes[name][0]]
+                offset = _aligned(offset + sizes[name][1])
+            header = json.dumps({"count": len(order), "sections": sections}).encode("utf-8")
+            if len(header) <= header_len:
+                break
+            header_len *= 2
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC + _HEADER_LEN.pack(header_len) + header.ljust(header_len))
+                for name, _ in _SECTIONS[:-1]:
+                    f.seek(sections[name][0])
+                    f.write(arrays[name].tobytes())
+                f.seek(sections["text_blob"][0])
+                for faiss_id in order:
+                    f.write(spool.read_bytes(faiss_id))
+                f.truncate(offset)
+            os.chmod(tmp_path, _replacement_mode(path))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _replacement_mode(path: str) -> int:
+    """The target's permissions, or 0644 under the umask for a new file (mkstemp creates 0600)."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o644 & ~umask
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def load_entries(path: str) -> list:
+    """Clause metadata as a list of dicts, from a store or a legacy JSON file."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return list(ClauseStore(path).entries())
+
+
+def migrate_json(json_path: str, store_path: str = None) -> str:
+    """Convert a legacy clause_metadata.json into a store next to it (or at `store_path`)."""
+    store_path = store_path or os.path.splitext(json_path)[0] + ".bin"
+    write_clause_store(store_path, load_entries(json_path))
+    return store_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clause metadata store tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="convert clause_metadata.json to clause_metadata.bin")
+    migrate.add_argument("json_path")
+    migrate.add_argument("-o", "--output")
+    export = commands.add_parser("export", help="dump a store as JSON (for inspection)")
+    export.add_argument("store_path")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        output = migrate_json(args.json_path, args.output)
+        print(f"✅ Migrated {len(ClauseStore(output))} clauses -> {output}")
+    else:
+        print(json.dumps(load_entries(args.store_path), indent=2, ensure_ascii=False))
@@ -1,14 +1,68 @@
 from docx import Document
 from docx.shared import Pt, Inches
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from datetime import datetime
-from docx2pdf import convert
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZIP_DEFLATED
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 import os
+import re
 
 from formatter import format_sections  # ✅ Required for auto conversion
+from telemetry import timed
 
-def export_to_docx(title: str, content, save_path: str = "./exports", company_1="Company 1", company_2="Company 2") -> str:
-    os.makedirs(save_path, exist_ok=True)
+INTRO_TEXT = (
+    "The Owner has requested and the Recipient agrees that the Recipient will protect the confidential "
+    "material and information which may be disclosed between the Owner and the Recipient. "
+    "Therefore, the parties agree as follows:"
+)
+WITNESS_TEXT = "IN WITNESS WHEREOF, the parties have executed this Agreement as of the Effective Date."
+SIGNATURE_LINE = "By: ____________________________    Date: ____________________"
+
+
+def effective_date_text(company_1: str, company_2: str) -> str:
+    today = datetime.today().strftime("%B %d, %Y")
+    return (
+        f'This Non-Disclosure Agreement (this "Agreement") is made effective as of {today} '
+        f'(the "Effective Date"), by and between {company_1}, of [Owner Address], and {company_2}, of [Recipient Address].'
+    )
+
+
+def classify_line(line: str):
+    """
+    Classify one stripped clause line the way exports lay it out.
+
+    Returns (kind, text) with kind one of "heading", "subclause", "bullet" or "body".
+    """
+    if line.startswith(". ") or line.isupper():
+        return "heading", line.lstrip(". ").upper()
+    elif len(line) > 3 and line[1:3] == ". " and line[0].isalpha():
+        return "subclause", line
+    elif line.startswith("- ") or line.startswith("• "):
+        return "bullet", line[2:]
+    return "body", line
+
+
+def iter_clause_lines(content):
+    """Yield (kind, text) for every non-empty line of `content` (text or `format_sections` output)."""
+    if isinstance(content, str):
+        content = format_sections(content)
+    for clause in content:
+        for line in clause["text"].split("\n"):
+            line = line.strip()
+            if line:
+                yield classify_line(line)
+
+
+def build_docx(title: str, content, company_1="Company 1", company_2="Company 2") -> Document:
+    """Build the agreement with python-docx, formatting each run; `render_docx` is the fast path."""
     doc = Document()
 
     # ─── Title ─────────────────────
@@ -19,68 +73,231 @@ def export_to_docx(title: str, content, save_path: str = "./exports", company_1=
     heading.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
 
     # ─── Intro Clause ──────────────
-    today = datetime.today().strftime("%B %d, %Y")
     intro = doc.add_paragraph()
-    intro.add_run(
-        f'\nThis Non-Disclosure Agreement (this "Agreement") is made effective as of {today} '
-        f'(the "Effective Date"), by and between {company_1}, of [Owner Address], and {company_2}, of [Recipient Address].\n\n'
-    ).font.size = Pt(12)
+    intro.add_run(f"\n{effective_date_text(company_1, company_2)}\n\n").font.size = Pt(12)
 
     p = doc.add_paragraph()
-    r = p.add_run(
-        "The Owner has requested and the Recipient agrees that the Recipient will protect the confidential "
-        "material and information which may be disclosed between the Owner and the Recipient. "
-        "Therefore, the parties agree as follows:"
-    )
+    r = p.add_run(INTRO_TEXT)
     r.font.size = Pt(12)
 
-    # ─── Normalize Content ─────────
-    if isinstance(content, str):
-        content = format_sections(content)
-
     # ─── Add Clauses ───────────────
-    for clause in content:
-        text = clause["text"]
-        for line in text.split("\n"):
-            line = line.strip()
-
-            if not line:
-                continue
-            elif line.startswith(". ") or line.isupper():
-                p = doc.add_paragraph()
-                r = p.add_run(line.lstrip(". ").upper())
-                r.bold = True
-                r.font.size = Pt(12)
-            elif len(line) > 3 and line[1:3] == ". " and line[0].isalpha():
-                p = doc.add_paragraph()
-                r = p.add_run(line)
-                r.bold = True
-                r.font.size = Pt(11)
-                p.paragraph_format.left_indent = Inches(0.3)
-            elif line.startswith("- ") or line.startswith("• "):
-                p = doc.add_paragraph(style='List Bullet')
-                p.paragraph_format.left_indent = Inches(0.5)
-                p.add_run(line[2:])
-            else:
-                p = doc.add_paragraph()
-                p.add_run(line).font.size = Pt(11)
+    for kind, line in iter_clause_lines(content):
+        if kind == "heading":
+            p = doc.add_paragraph()
+            r = p.add_run(line)
+            r.bold = True
+            r.font.size = Pt(12)
+        elif kind == "subclause":
+            p = doc.add_paragraph()
+            r = p.add_run(line)
+            r.bold = True
+            r.font.size = Pt(11)
+            p.paragraph_format.left_indent = Inches(0.3)
+        elif kind == "bullet":
+            p = doc.add_paragraph(style='List Bullet')
+            p.paragraph_format.left_indent = Inches(0.5)
+            p.add_run(line)
+        else:
+            p = doc.add_paragraph()
+            p.add_run(line).font.size = Pt(11)
 
     # ─── Signature Block ───────────
-    doc.add_paragraph("\nIN WITNESS WHEREOF, the parties have executed this Agreement as of the Effective Date.\n")
+    doc.add_paragraph(f"\n{WITNESS_TEXT}\n")
     doc.add_paragraph(f"{company_1.upper()}:")
-    doc.add_paragraph("By: ____________________________    Date: ____________________\n")
+    doc.add_paragraph(f"{SIGNATURE_LINE}\n")
     doc.add_paragraph(f"{company_2.upper()}:")
-    doc.add_paragraph("By: ____________________________    Date: ____________________")
+    doc.add_paragraph(SIGNATURE_LINE)
+
+    return doc
+
+
+# ─── DOCX Skeleton ─────────────
+# Line kind -> (style name, based on, bold, size pt, left indent in, centered); mirrors `build_docx`.
+DOCX_STYLES = {
+    "title": ("Accordly Title", "Normal", True, 18, None, True),
+    "intro": ("Accordly Intro", "Normal", None, 12, None, False),
+    "heading": ("Accordly Heading", "Normal", True, 12, None, False),
+    "subclause": ("Accordly Subclause", "Normal", True, 11, 0.3, False),
+    "bullet": ("Accordly Bullet", "List Bullet", None, None, 0.5, False),
+    "body": ("Accordly Body", "Normal", None, 11, None, False),
+}
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_RUN_BREAKS = re.compile(r"(\n|\r|\t)")
+
+
+def _run_xml(text: str) -> str:
+    """Run content for `text`, with line breaks and tabs as python-docx writes them."""
+    text = _XML_INVALID.sub("", text)
+    if not _RUN_BREAKS.search(text):
+        return f'<w:t xml:space="preserve">{escape(text)}</w:t>'
+    parts = []
+    for piece in _RUN_BREAKS.split(text):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\n", "\r"):
+            parts.append("<w:br/>")
+        elif piece:
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+    return "".join(parts)
+
+
+def _paragraph_xml(text: str, style_id: str = None) -> str:
+    style = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ""
+    return f"<w:p>{style}<w:r>{_run_xml(text)}</w:r></w:p>"
+
+
+@lru_cache(maxsize=1)
+def _docx_skeleton() -> dict:
+    """
+    Pre-styled DOCX package, built once per process.
+
+    Holds every part of the package except word/document.xml as ready-deflated
+    zip bytes, the document.xml text around the body content, the style id
+    per line kind and the paragraphs that never change between exports.
+    """
+    doc = Document()
+    style_ids = {}
+    for kind, (name, based_on, bold, size, indent, centered) in DOCX_STYLES.items():
+        style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = doc.styles[based_on]
+        style.quick_style = True
+        if bold:
+            style.font.bold = True
+        if size:
+            style.font.size = Pt(size)
+        if indent:
+            style.paragraph_format.left_indent = Inches(indent)
+        if centered:
+            style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+        style_ids[kind] = style.style_id
+
+    saved = BytesIO()
+    doc.save(saved)
+    package = BytesIO()
+    with ZipFile(saved) as source, ZipFile(package, "w", ZIP_DEFLATED) as target:
+        document_xml = source.read("word/document.xml").decode("utf-8")
+        for info in source.infolist():
+            if info.filename != "word/document.xml":
+                target.writestr(info, source.read(info))
+
+    body_start = document_xml.index("<w:body>") + len("<w:body>")
+    body_end = document_xml.index("<w:sectPr", body_start)
+    return {
+        "package": package.getvalue(),
+        "head": document_xml[:body_start],
+        "tail": document_xml[body_end:],
+        "styles": style_ids,
+        "intro": _paragraph_xml(INTRO_TEXT, style_ids["intro"]),
+        "witness": _paragraph_xml(f"\n{WITNESS_TEXT}\n"),
+        "signature_gap": _paragraph_xml(f"{SIGNATURE_LINE}\n"),
+        "signature": _paragraph_xml(SIGNATURE_LINE),
+    }
+
+
+@timed("render_docx")
+def render_docx(title: str, content, company_1="Company 1", company_2="Company 2") -> bytes:
+    """
+    Render the agreement to DOCX bytes in memory, without touching disk.
+
+    Lays out the same document as `build_docx`, but fills the cached skeleton:
+    paragraphs reference its named styles instead of formatting each run, and
+    only word/document.xml is generated and compressed per request.
+    """
+    skeleton = _docx_skeleton()
+    styles = skeleton["styles"]
+    parts = [
+        skeleton["head"],
+        _paragraph_xml(title.upper(), styles["title"]),
+        _paragraph_xml(f"\n{effective_date_text(company_1, company_2)}\n\n", styles["intro"]),
+        skeleton["intro"],
+    ]
+    parts.extend(_paragraph_xml(line, styles[kind]) for kind, line in iter_clause_lines(content))
+    parts += [
+        skeleton["witness"],
+        _paragraph_xml(f"{company_1.upper()}:"),
+        skeleton["signature_gap"],
+        _paragraph_xml(f"{company_2.upper()}:"),
+        skeleton["signature"],
+        skeleton["tail"],
+    ]
+
+    buffer = BytesIO(skeleton["package"])
+    with ZipFile(buffer, "a", ZIP_DEFLATED) as package:
+        package.writestr("word/document.xml", "".join(parts))
+    return buffer.getvalue()
+
+
+def export_to_docx(title: str, content, save_path: str = "./exports", company_1="Company 1", company_2="Company 2") -> str:
+    os.makedirs(save_path, exist_ok=True)
+    data = render_docx(title, content, company_1, company_2)
 
     # ─── Save DOCX ─────────────────
     filename = f"NDA_{datetime.today().strftime('%Y%m%d_%H%M%S')}.docx"
     file_path = os.path.join(save_path, filename)
-    doc.save(file_path)
+    with open(file_path, "wb") as f:
+        f.write(data)
     return file_path
 
 
+# ─── PDF Rendering ─────────────
+@lru_cache(maxsize=1)
+def _pdf_styles() -> dict:
+    """Paragraph styles mirroring the DOCX layout; built once per process."""
+    body = ParagraphStyle("AccordlyBody", fontName="Helvetica", fontSize=11, leading=14, spaceAfter=6)
+    return {
+        "title": ParagraphStyle("AccordlyTitle", parent=body, fontName="Helvetica-Bold", fontSize=18,
+                                leading=22, alignment=TA_CENTER, spaceAfter=12),
+        "intro": ParagraphStyle("AccordlyIntro", parent=body, fontSize=12, leading=15, spaceAfter=10),
+        "heading": ParagraphStyle("AccordlyHeading", parent=body, fontName="Helvetica-Bold", fontSize=12,
+                                  leading=15, spaceBefore=6),
+        "subclause": ParagraphStyle("AccordlySubclause", parent=body, fontName="Helvetica-Bold",
+                                    leftIndent=0.3 * inch),
+        "bullet": ParagraphStyle("AccordlyBullet", parent=body, leftIndent=0.5 * inch, bulletIndent=0.3 * inch),
+        "body": body,
+    }
+
+
+@timed("render_pdf")
+def render_pdf(title: str, content, company_1="Company 1", company_2="Company 2") -> bytes:
+    """
+    Render the agreement straight to PDF bytes in-process (no Word / docx2pdf).
+
+    Uses the same clause structure and line rules as `export_to_docx`.
+    """
+    styles = _pdf_styles()
+    story = [
+        Paragraph(escape(title.upper()), styles["title"]),
+        Paragraph(escape(effective_date_text(company_1, company_2)), styles["intro"]),
+        Paragraph(escape(INTRO_TEXT), styles["intro"]),
+    ]
+    for kind, line in iter_clause_lines(content):
+        if kind == "bullet":
+            story.append(Paragraph(escape(line), styles["bullet"], bulletText="•"))
+        else:
+            story.append(Paragraph(escape(line), styles[kind]))
+
+    story += [
+        Spacer(1, 12),
+        Paragraph(escape(WITNESS_TEXT), styles["body"]),
+        Spacer(1, 12),
+        Paragraph(escape(f"{company_1.upper()}:"), styles["body"]),
+        Paragraph(escape(SIGNATURE_LINE), styles["body"]),
+        Spacer(1, 12),
+        Paragraph(escape(f"{company_2.upper()}:"), styles["body"]),
+        Paragraph(escape(SIGNATURE_LINE), styles["body"]),
+    ]
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=LETTER, title=title, leftMargin=inch, rightMargin=inch,
+                            topMargin=inch, bottomMargin=inch)
+    doc.build(story)
+    return buffer.getvalue()
+
+
 def export_to_pdf(title: str, content, save_path: str = "./exports", company_1="Company 1", company_2="Company 2") -> str:
-    docx_path = export_to_docx(title, content, save_path, company_1, company_2)
-    pdf_path = docx_path.replace(".docx", ".pdf")
-    convert(docx_path, pdf_path)
+    os.makedirs(save_path, exist_ok=True)
+    filename = f"NDA_{datetime.today().strftime('%Y%m%d_%H%M%S')}.pdf"
+    pdf_path = os.path.join(save_path, filename)
+    with open(pdf_path, "wb") as f:
+        f.write(render_pdf(title, content, company_1, company_2))
     return pdf_path
@@ -1,5 +1,7 @@
 import re
 
+from telemetry import timed
+
 # 🏷️ Clause Tagging Logic
 
 def tag_clause(header: str) -> str:
@@ -40,12 +42,14 @@ def clean_contract_text(text: str) -> str:
 
 # 🧱 Step 2: Format clause titles
 
+TITLE_PATTERN = re.compile(r'^\.* ?[A-Z][A-Z ]{3,}$')
+
 def emphasize_titles(text: str) -> str:
     lines = text.split("\n")
     section_num = 1
     formatted = []
     for line in lines:
-        if re.match(r'^\.* ?[A-Z][A-Z ]{3,}$', line.strip()):
+        if TITLE_PATTERN.match(line.strip()):
             title = line.strip().lstrip('. ').strip()
             formatted.append(f"\n{section_num}. {title.upper()}\n")
             section_num += 1
@@ -88,6 +92,11 @@ By: _______________________        Date: _______________
 # 🎯 Step 6: Apply full formatting pipeline
 
 def format_contract(text: str) -> str:
+    return format_contract_with_sections(text)[0]
+
+
+def format_contract_pipeline(text: str) -> str:
+    """Reference multi-pass pipeline; `format_contract_with_sections` reproduces it byte for byte."""
     text = clean_contract_text(text)
     text = emphasize_titles(text)
     text = format_subclauses(text)
@@ -120,3 +129,171 @@ def is_contract_ready(text: str) -> bool:
         return False
     keywords = ["agreement", "confidential", "parties", "terms", "termination", "jurisdiction"]
     return all(k.lower() in text.lower() for k in keywords)
+
+
+# 🌊 Step 9: Incremental formatting for streamed output
+
+class IncrementalFormatter:
+    """
+    Apply the formatting pipeline to streamed model output, one completed line at a time.
+
+    `feed()` accepts raw text deltas and returns the clauses (tagged like
+    `format_sections`) that were closed by them; `finish()` flushes the rest.
+    A clause closes on a blank line or when a new title starts.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._section = []
+        self._section_num = 1
+        self._first_line = True
+
+    def feed(self, chunk: str) -> list:
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        closed = []
+        for line in lines:
+            closed.extend(self._consume(line))
+        return closed
+
+    def finish(self) -> list:
+        closed = self._consume(self._pending) if self._pending else []
+        self._pending = ""
+        closed.extend(self._close())
+        return closed
+
+    def _consume(self, raw: str) -> list:
+        line = clean_contract_text(raw)
+        if not line:
+            return self._close()
+
+        first_line, self._first_line = self._first_line, False
+        if TITLE_PATTERN.match(line):
+            closed = self._close()
+            title = line.lstrip('. ').strip()
+            self._section.append(f"{self._section_num}. {title.upper()}")
+            self._section_num += 1
+            closed.extend(self._close())
+            return closed
+
+        if not first_line:
+            line = format_bullets(format_subclauses("\n" + line))[1:]
+        self._section.append(line)
+        return []
+
+    def _close(self) -> list:
+        if not self._section:
+            return []
+        text = "\n".join(self._section).strip()
+        self._section = []
+        return [{"tag": tag_clause(text.split("\n")[0]), "text": text}]
+
+
+# ⚡ Step 10: Single-pass formatter engine
+
+_WS_RUN = re.compile(r'[ \t]+')
+_DASH_RUN = re.compile(r'—+')
+_SUBCLAUSE = re.compile(r'[A-Da-d]\. ')
+_BULLET = re.compile(r'[-•]\s+(?=\S)')
+_BARE_BULLET = re.compile(r'[-•]\s*')
+_SIGNATURE_LINES = add_signature_block().rstrip("\n").split("\n")[1:]
+
+
+class _SectionSplitter:
+    """Emulates `text.strip().split("\\n\\n")` over a stream of lines."""
+
+    def __init__(self):
+        self.sections = []
+        self._current = None
+        self._started = False
+        self._consumed = False   # the newline before the next line belongs to a split point
+
+    def feed(self, line: str):
+        if not self._started:
+            if line:
+                self._started = True
+                self._current = [line]
+        elif self._consumed:
+            self._current = [line]
+            self._consumed = False
+        elif not line:
+            self.sections.append(self._current)
+            self._current = None
+            self._consumed = True
+        else:
+            self._current.append(line)
+
+    def finish(self) -> list:
+        if self._current is not None:
+            self.sections.append(self._current)
+            self._current = None
+        return [{"tag": tag_clause(lines[0]), "text": "\n".join(lines).strip()} for lines in self.sections]
+
+
+@timed("format")
+def format_contract_with_sections(text: str, double_clean: bool = False):
+    """
+    Format a contract and split it into tagged sections in one line-oriented pass.
+
+    Returns `(formatted, sections)`, byte-identical to `format_contract_pipeline(text)`
+    and `format_sections(...)` of it. With `double_clean=True` it matches
+    `format_contract_pipeline(clean_contract_text(text))`, the text the
+    export endpoints render, without the extra cleaning pass.
+
+    A bullet marker with nothing after it on its line makes the reference
+    regex swallow the following newlines; that rare case falls back to the
+    multi-pass pipeline.
+    """
+    out = []
+    splitter = _SectionSplitter()
+    section_num = 1
+    prev_empty = False
+
+    for raw in text.strip().split("\n"):
+        # ─── Step 1: clean ─────────────
+        line = _WS_RUN.sub(" ", raw) if "\t" in raw or "  " in raw else raw
+        if line[:1] == " " or line[-1:] == " ":
+            line = line.strip(" ")
+        if "—" in line:
+            line = _DASH_RUN.sub("—", line)
+
+        # Runs of blank lines collapse to one (after cleanup when cleaning twice).
+        empty = not (line if double_clean else raw)
+        if empty and prev_empty:
+            continue
+        prev_empty = empty
+
+        # ─── Step 2: titles ────────────
+        stripped = line.strip()
+        if stripped and TITLE_PATTERN.match(stripped):
+            title = stripped.lstrip('. ').strip()
+            for part in ("", f"{section_num}. {title.upper()}", ""):
+                out.append(part)
+                splitter.feed(part)
+            section_num += 1
+            continue
+
+        # ─── Steps 3-4: subclauses and bullets (never on the first line) ─
+        if out:
+            if _SUBCLAUSE.match(line):
+                line = "    " + line
+            else:
+                bullet = _BULLET.match(line)
+                if bullet:
+                    line = "    • " + line[bullet.end():]
+                elif _BARE_BULLET.fullmatch(line):
+                    return _format_with_sections_fallback(text, double_clean)
+
+        out.append(line)
+        splitter.feed(line)
+
+    for line in _SIGNATURE_LINES:
+        splitter.feed(line)
+    return "\n".join(out) + add_signature_block(), splitter.finish()
+
+
+def _format_with_sections_fallback(text: str, double_clean: bool):
+    if double_clean:
+        text = clean_contract_text(text)
+    formatted = format_contract_pipeline(text)
+    return formatted, format_sections(formatted)
@@ -1,45 +1,435 @@
 import os
+import json
 import time
-from openai import OpenAI
+import sqlite3
+import hashlib
+import threading
+import random
+import asyncio
+import httpx
+from collections import OrderedDict
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from llm_scheduler import AdmissionRejected, classify_error, llm_scheduler
+from telemetry import get_logger, record, registry, stage
+
 # Load API key from .env file
 load_dotenv()
 
+# === CONFIG ===
+MODEL = "gpt-3.5-turbo"
+SYSTEM_MESSAGE = "You are a legal assistant that drafts clear, professional contracts."
+TEMPERATURE = 0.3
+MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1500"))      # default completion cap; callers may pass a budget
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))                  # seconds per attempt
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))   # shared pool size
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_SIZE", "256"))  # in-memory LRU entries
+CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "86400"))        # seconds
+CACHE_DB_PATH = os.getenv("GENERATION_CACHE_DB")                     # optional SQLite tier
+CACHE_DB_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_DB_SIZE", "10000"))
+
 # ✅ Use environment variable (recommended way for new SDK)
-client = OpenAI()
+# OPENAI_BASE_URL is honoured by the SDK, so the client can point at a local fake server.
+_async_client = None
+
+log = get_logger("gpt")
+llm_requests = registry.counter("accordly_llm_requests", "LLM calls by outcome (ok, error, cache_hit).", ("outcome",))
+
 
-def generate_contract(prompt: str, retries: int = 2, delay: float = 1.5) -> str:
+# === GENERATION CACHE ===
+class GenerationCache:
     """
-    Generate a contract using GPT-3.5-Turbo via OpenAI API.
+    Content-addressed cache of completions.
 
-    :param prompt: Full prompt to send to GPT
-    :param retries: Number of retry attempts on failure
-    :param delay: Seconds to wait between retries
-    :return: Generated contract text
+    Keys are a SHA-256 of the full request (model, system message, temperature,
+    max tokens and the *rendered* prompt). `nda_template` bakes today's date into
+    the prompt when no effective date is given, so identical requests hit within
+    the same day and naturally miss once the date changes.
+
+    Tier 1 is an in-process LRU; tier 2 is an optional SQLite file that survives
+    restarts. Both tiers evict by TTL and by entry count.
     """
-    print("📤 Prompt sent to OpenAI:")
-    print(prompt)
-    print("🔁 Generating contract...")
 
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL,
+                 db_path: str = None, db_max_entries: int = CACHE_DB_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(prompt: str, model: str = MODEL, system: str = SYSTEM_MESSAGE,
+                 temperature: float = TEMPERATURE, max_tokens: int = MAX_TOKENS) -> str:
+        payload = json.dumps([model, system, temperature, max_tokens, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM generations WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created <= self.ttl:
+                        self._remember(key, value, created)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM generations WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str):
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO generations (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, created)
+                )
+                self._db.execute(
+                    "DELETE FROM generations WHERE created < ? OR key NOT IN "
+                    "(SELECT key FROM generations ORDER BY created DESC LIMIT ?)",
+                    (created - self.ttl, self.db_max_entries)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM generations")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._memory),
+            }
+
+
+generation_cache = GenerationCache(db_path=CACHE_DB_PATH)
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Return the process-wide async client, creating it on first use.
+
+    All requests share one bounded httpx connection pool, so concurrency is
+    limited by LLM_MAX_CONNECTIONS rather than by the number of workers.
+    Retries are handled in `agenerate_contract`, not by the SDK.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            max_retries=0,
+            timeout=LLM_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                ),
+                timeout=LLM_TIMEOUT,
+            ),
+        )
+    return _async_client
+
+
+async def close_async_client():
+    """Close the shared async client (call on application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def _messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _log_cache_hit(key: str):
+    llm_requests.inc(outcome="cache_hit")
+    log.info("served contract from generation cache", extra={"cache_key": key[:12]})
+
+
+def _log_request(key: str, prompt: str, max_tokens: int):
+    # The prompt holds party names and deal scope; it is only logged at DEBUG.
+    log.info("generating contract", extra={"cache_key": key[:12], "prompt_chars": len(prompt), "max_tokens": max_tokens})
+    log.debug("prompt", extra={"cache_key": key[:12], "prompt": prompt})
+
+
+def _log_success(key: str, content: str):
+    llm_requests.inc(outcome="ok")
+    log.info("contract generated", extra={"cache_key": key[:12], "completion_chars": len(content)})
+
+
+def _log_failure(key: str, attempt: int, error: str):
+    llm_requests.inc(outcome="error")
+    log.warning("llm attempt failed", extra={"cache_key": key[:12], "attempt": attempt + 1, "error": error})
+
+
+def estimate_request_tokens(prompt: str, max_tokens: int = MAX_TOKENS) -> int:
+    """What a call counts against the tokens/min limit: prompt (~4 chars per token) plus the completion cap."""
+    return (len(SYSTEM_MESSAGE) + len(prompt)) // 4 + (max_tokens or MAX_TOKENS)
+
+
+def _backoff(attempt: int, delay: float) -> float:
+    """Exponential backoff with full jitter: random value in [0, delay * 2^attempt]."""
+    return random.uniform(0, delay * (2 ** attempt))
+
+
+# === SINGLE-FLIGHT ===
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller (the leader) starts the task; later callers with the same
+    key await the same result. Each waiter is shielded from the others, so one
+    client disconnecting does not cancel the shared call. The call is cancelled
+    only once every waiter has gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def run(self, key: str, factory):
+        call = self._calls.get(key)
+        if call is None:
+            call = {"task": asyncio.ensure_future(factory()), "waiters": 0}
+            self._calls[key] = call
+            call["task"].add_done_callback(lambda _, k=key, c=call: self._forget(k, c))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                # Last waiter left: stop paying for a result nobody will read.
+                self._forget(key, call)
+                call["task"].cancel()
+                self.abandoned += 1
+
+    def _forget(self, key: str, call: dict):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._calls),
+        }
+
+
+inflight_generations = SingleFlight()
+
+
+async def _acomplete(prompt: str, retries: int, delay: float, timeout: float, max_tokens: int = MAX_TOKENS,
+                     key: str = "", priority: str = "interactive") -> str:
+    tokens = estimate_request_tokens(prompt, max_tokens)
     for attempt in range(retries + 1):
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a legal assistant that drafts clear, professional contracts."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=800
-            )
+            async with llm_scheduler.admit(priority, tokens) as ticket:
+                with stage("llm"):
+                    response = await asyncio.wait_for(
+                        get_async_client().chat.completions.create(
+                            model=MODEL,
+                            messages=_messages(prompt),
+                            temperature=TEMPERATURE,
+                            max_tokens=max_tokens
+                        ),
+                        timeout=timeout
+                    )
+                usage = getattr(response, "usage", None)
+                llm_scheduler.release(ticket, "ok", tokens_used=usage.total_tokens if usage else None)
             content = response.choices[0].message.content.strip()
-            print("✅ GPT Contract Generated Successfully")
+            _log_success(key, content)
             return content
 
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            print(f"❌ Attempt {attempt + 1} failed: {str(e)}")
+            error = str(e) or type(e).__name__
+            _log_failure(key, attempt, error)
             if attempt < retries:
-                time.sleep(delay)
+                await asyncio.sleep(_backoff(attempt, delay))
             else:
-                raise RuntimeError(f"OpenAI API Error after {retries + 1} attempts: {str(e)}")
+                raise RuntimeError(f"OpenAI API Error after {retries + 1} attempts: {error}")
+
+
+async def agenerate_contract(prompt: str, retries: int = 2, delay: float = 1.5, timeout: float = None,
+                             use_cache: bool = True, max_tokens: int = None, priority: str = "interactive") -> str:
+    """
+    Generate a contract using GPT-3.5-Turbo via OpenAI API, without blocking the event loop.
+
+    Identical prompts are served from `generation_cache`, and concurrent calls
+    with the same prompt share one LLM request (see `SingleFlight`).
+
+    :param prompt: Full prompt to send to GPT
+    :param retries: Number of retry attempts on failure
+    :param delay: Base backoff in seconds (doubled per attempt, with jitter)
+    :param timeout: Seconds allowed per attempt (defaults to LLM_TIMEOUT)
+    :param use_cache: Serve identical prompts from `generation_cache`
+    :param max_tokens: Completion token cap (defaults to MAX_TOKENS)
+    :param priority: Scheduler class ("interactive", "export" or "batch", see `llm_scheduler`)
+    :return: Generated contract text
+    :raises AdmissionRejected: if the call can't be admitted before the class deadline
+    """
+    max_tokens = max_tokens or MAX_TOKENS
+    key = GenerationCache.make_key(prompt, max_tokens=max_tokens)
+    if use_cache:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            _log_cache_hit(key)
+            return cached
+
+    timeout = timeout or LLM_TIMEOUT
+
+    async def generate():
+        _log_request(key, prompt, max_tokens)
+        content = await _acomplete(prompt, retries, delay, timeout, max_tokens, key, priority)
+        if use_cache:
+            generation_cache.set(key, content)
+        return content
+
+    # Callers only share a call within one priority class: a joiner waits under, and can be
+    # rejected by, the admission deadline of whoever started it.
+    return await inflight_generations.run(f"{key}:{int(use_cache)}:{priority}", generate)
+
+
+async def astream_contract(prompt: str, retries: int = 2, delay: float = 1.5, timeout: float = None,
+                           use_cache: bool = True, max_tokens: int = None, priority: str = "interactive",
+                           ticket=None):
+    """
+    Stream a contract from the model as it is generated.
+
+    Yields text deltas. Opening the stream is retried like `agenerate_contract`;
+    once tokens have been sent a failure is raised to the caller. The finished
+    text is stored in `generation_cache`, and a cache hit is yielded as one chunk.
+    The scheduler slot is held until the stream ends.
+
+    :param prompt: Full prompt to send to GPT
+    :param retries: Number of retry attempts when opening the stream
+    :param delay: Base backoff in seconds (doubled per attempt, with jitter)
+    :param timeout: Seconds allowed to open the stream (defaults to LLM_TIMEOUT)
+    :param use_cache: Serve identical prompts from `generation_cache`
+    :param max_tokens: Completion token cap (defaults to MAX_TOKENS)
+    :param priority: Scheduler class ("interactive", "export" or "batch", see `llm_scheduler`)
+    :param ticket: Admission already acquired by the caller (used for the first attempt)
+    :raises AdmissionRejected: if the call can't be admitted before the class deadline
+    """
+    max_tokens = max_tokens or MAX_TOKENS
+    key = GenerationCache.make_key(prompt, max_tokens=max_tokens)
+    if use_cache:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            if ticket is not None:
+                llm_scheduler.release(ticket, "cancelled")
+            _log_cache_hit(key)
+            yield cached
+            return
+
+    timeout = timeout or LLM_TIMEOUT
+    _log_request(key, prompt, max_tokens)
+    started = time.perf_counter()
+
+    try:
+        for attempt in range(retries + 1):
+            if ticket is None:
+                ticket = await llm_scheduler.acquire(priority, estimate_request_tokens(prompt, max_tokens))
+            try:
+                stream = await asyncio.wait_for(
+                    get_async_client().chat.completions.create(
+                        model=MODEL,
+                        messages=_messages(prompt),
+                        temperature=TEMPERATURE,
+                        max_tokens=max_tokens,
+                        stream=True
+                    ),
+                    timeout=timeout
+                )
+                break
+            except Exception as e:
+                llm_scheduler.release(ticket, *classify_error(e))
+                ticket = None
+                error = str(e) or type(e).__name__
+                _log_failure(key, attempt, error)
+                if attempt < retries:
+                    await asyncio.sleep(_backoff(attempt, delay))
+                else:
+                    raise RuntimeError(f"OpenAI API Error after {retries + 1} attempts: {error}")
+
+        parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    record("llm_first_token", time.perf_counter() - started)
+                parts.append(delta)
+                yield delta
+    except BaseException as e:
+        if ticket is not None:
+            llm_scheduler.release(ticket, *classify_error(e))
+        raise
+    llm_scheduler.release(ticket, "ok")
+
+    content = "".join(parts).strip()
+    record("llm", time.perf_counter() - started)
+    _log_success(key, content)
+    if use_cache and content:
+        generation_cache.set(key, content)
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from collections import Counter, deque
+
+from llm_scheduler import AdmissionRejected
+from nda_pipeline import TITLE, EXPORT_FORMATS, preview_nda, generate_export_text, render_export
+from telemetry import get_logger
+
+# === CONFIG ===
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))                  # concurrent jobs
+JOB_LLM_CONCURRENCY = int(os.getenv("JOB_LLM_CONCURRENCY", "2"))  # concurrent LLM calls from jobs
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))        # seconds finished jobs are kept
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))                   # seconds a running job's claim lasts without a heartbeat
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "60")) # seconds between purge / stale-job sweeps
+JOB_WAIT_POLL = float(os.getenv("JOB_WAIT_POLL", "0.5"))          # seconds between store checks while long-polling
+
+log = get_logger("jobs")
+
+JOB_KINDS = ("generate", "export_docx", "export_pdf")
+FINISHED = ("succeeded", "failed")
+
+
+# === JOB STORE ===
+class JobStore:
+    """SQLite-backed job table; survives restarts so queued work can be resumed."""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+                "created REAL NOT NULL, started REAL, finished REAL, error TEXT, result TEXT, "
+                "artifact BLOB, media_type TEXT, heartbeat REAL)"
+            )
+            columns = [row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            if "heartbeat" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            self._db.commit()
+
+    def _execute(self, sql: str, args=()):
+        with self._lock:
+            cursor = self._db.execute(sql, args)
+            self._db.commit()
+            return cursor
+
+    def create(self, kind: str, params: dict) -> str:
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, params, status, created) VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, kind, json.dumps(params), time.time())
+        )
+        return job_id
+
+    def get(self, job_id: str, with_artifact: bool = False):
+        columns = "*" if with_artifact else \
+            "id, kind, params, status, created, started, finished, error, result, media_type"
+        with self._lock:
+            row = self._db.execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, job_id: str, lease: float) -> bool:
+        """
+        Atomically mark a job running for this worker.
+
+        Succeeds for queued jobs, and for running jobs whose heartbeat is older
+        than `lease` (their worker died). Returns False when someone else has it.
+        """
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'running', started = ?, heartbeat = ? WHERE id = ? AND "
+            "(status = 'queued' OR (status = 'running' AND COALESCE(heartbeat, started, 0) < ?))",
+            (now, now, job_id, now - lease)
+        )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str):
+        self._execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def release(self, job_id: str):
+        """Hand a claimed job back to the queue."""
+        self._execute("UPDATE jobs SET status = 'queued', heartbeat = NULL WHERE id = ? AND status = 'running'",
+                      (job_id,))
+
+    def mark_succeeded(self, job_id: str, result=None, artifact: bytes = None, media_type: str = None):
+        self._execute(
+            "UPDATE jobs SET status = 'succeeded', finished = ?, result = ?, artifact = ?, media_type = ? WHERE id = ?",
+            (time.time(), json.dumps(result) if result is not None else None, artifact, media_type, job_id)
+        )
+
+    def mark_failed(self, job_id: str, error: str):
+        self._execute("UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                      (time.time(), error, job_id))
+
+    def claimable(self, lease: float) -> list:
+        """Queued jobs, plus running jobs whose lease has expired."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR "
+                "(status = 'running' AND COALESCE(heartbeat, started, 0) < ?) ORDER BY created",
+                (time.time() - lease,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge(self, older_than: float):
+        self._execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished < ?",
+                      (time.time() - older_than,))
+
+
+# === JOB MANAGER ===
+class JobManager:
+    """
+    Bounded asyncio worker pool over a persistent job store.
+
+    Jobs are picked up in submission order by `workers` tasks. LLM-bound steps
+    are additionally capped by `llm_concurrency`, so a burst of jobs can't
+    flood the provider.
+
+    Workers claim a job atomically in the store before running it, so several
+    processes can share one job table without running a job twice. A running
+    job heartbeats every JOB_LEASE / 3 seconds. A periodic sweep purges expired
+    jobs and picks up queued jobs and jobs whose lease ran out because their
+    worker died.
+    """
+
+    def __init__(self, store: JobStore = None, workers: int = JOB_WORKERS,
+                 llm_concurrency: int = JOB_LLM_CONCURRENCY):
+        self.store = store or JobStore()
+        self.workers = workers
+        self.llm_concurrency = llm_concurrency
+        self._queue = None
+        self._llm_slots = None
+        self._tasks = []
+        self._events = {}
+        self._waiters = Counter()
+        self._queued_at = {}
+        self._deferred = set()
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_waits = deque(maxlen=1000)
+        self.run_times = deque(maxlen=1000)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _enqueue(self, job_id: str):
+        self._deferred.discard(job_id)
+        self._queued_at[job_id] = time.monotonic()
+        self._queue.put_nowait(job_id)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.to_thread(self.store.purge, JOB_RETENTION)
+            for job_id in await asyncio.to_thread(self.store.claimable, JOB_LEASE):
+                if job_id not in self._queued_at and job_id not in self._deferred:
+                    self._enqueue(job_id)
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+
+    async def submit(self, kind: str, params: dict) -> str:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = await asyncio.to_thread(self.store.create, kind, params)
+        self._enqueue(job_id)
+        return job_id
+
+    async def wait(self, job_id: str, timeout: float):
+        """
+        Long-poll: return the job once it finishes or `timeout` elapses.
+
+        Jobs finished in this process wake the waiter at once. The row is also
+        re-read every JOB_WAIT_POLL seconds, so jobs that another worker
+        process finished are returned within one poll too.
+        """
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["status"] in FINISHED or timeout <= 0:
+            return job
+        deadline = time.monotonic() + timeout
+        event = self._events.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] += 1
+        try:
+            while not event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), min(JOB_WAIT_POLL, remaining))
+                except asyncio.TimeoutError:
+                    job = await asyncio.to_thread(self.store.get, job_id)
+                    if job is None or job["status"] in FINISHED:
+                        return job
+        finally:
+            self._waiters[job_id] -= 1
+            if self._waiters[job_id] <= 0:
+                del self._waiters[job_id]
+                if self._events.get(job_id) is event:
+                    del self._events[job_id]
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self.queue_waits.append(time.monotonic() - self._queued_at.pop(job_id, time.monotonic()))
+            try:
+                if await asyncio.to_thread(self.store.claim, job_id, JOB_LEASE):
+                    await self._process(job_id)
+            except Exception as e:
+                # Left for the next sweep.
+                log.warning("job claim failed", extra={"job_id": job_id, "error": str(e)})
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str):
+        self.running += 1
+        started = time.monotonic()
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        requeued = False
+        try:
+            await self._run(job_id)
+            self.completed += 1
+        except AdmissionRejected as e:
+            # The LLM is saturated: put the job back instead of failing it.
+            await asyncio.to_thread(self.store.release, job_id)
+            self._deferred.add(job_id)
+            asyncio.get_running_loop().call_later(e.retry_after, self._enqueue, job_id)
+            requeued = True
+        except Exception as e:
+            self.failed += 1
+            await asyncio.to_thread(self.store.mark_failed, job_id, str(e))
+        finally:
+            heartbeat.cancel()
+            self.running -= 1
+            self.run_times.append(time.monotonic() - started)
+            event = None if requeued else self._events.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            await asyncio.to_thread(self.store.heartbeat, job_id)
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return
+        params = json.loads(job["params"])
+
+        if job["kind"] == "generate":
+            async with self._llm_slots:
+                result = await preview_nda(**params, priority="batch")
+            await asyncio.to_thread(self.store.mark_succeeded, job_id, result)
+            return
+
+        fmt = job["kind"].split("_", 1)[1]
+        async with self._llm_slots:
+            formatted_output = await generate_export_text(**params, priority="batch")
+        data = await render_export(fmt, TITLE, formatted_output, params["company_1"], params["company_2"])
+        await asyncio.to_thread(self.store.mark_succeeded, job_id, None, data, EXPORT_FORMATS[fmt][1])
+
+    def metrics(self) -> dict:
+        def percentile(values, q):
+            ordered = sorted(values)
+            return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 4) if ordered else None
+
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "workers": self.workers,
+            "llm_concurrency": self.llm_concurrency,
+            "queue_wait_p50_s": percentile(self.queue_waits, 0.5),
+            "queue_wait_p95_s": percentile(self.queue_waits, 0.95),
+            "run_time_p50_s": percentile(self.run_times, 0.5),
+            "run_time_p95_s": percentile(self.run_times, 0.95),
+        }
+
+
+def job_view(job: dict) -> dict:
+    """Public JSON shape of a job (no artifact bytes)."""
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"],
+        "error": job["error"],
+        "params": json.loads(job["params"]),
+    }
+    if job["result"]:
+        view["result"] = json.loads(job["result"])
+    if job["media_type"]:
+        view["artifact_url"] = f"/jobs/{job['id']}/artifact"
+    return view
@@ -0,0 +1,119 @@
+import os
+import re
+import argparse
+from collections import Counter
+import numpy as np
+
+from clause_store import load_entries
+
+# === CONFIG ===
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the this to was were which will "
+    "with".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+# === BM25 INVERTED INDEX ===
+class LexicalIndex:
+    """
+    BM25 over the clause chunks, with postings in flat NumPy arrays.
+
+    Term `t` owns `doc_ids[offsets[t]:offsets[t + 1]]` (positions into
+    `faiss_ids`) and the matching term frequencies in `tfs`. A query sums
+    per-term BM25 contributions with one `np.bincount` and takes the top-k
+    with `argpartition`. Results are (faiss_id, score) pairs, best first.
+    """
+
+    def __init__(self, terms: list, offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 faiss_ids: np.ndarray, doc_lengths: np.ndarray):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.faiss_ids = faiss_ids
+        self.doc_lengths = doc_lengths
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        counts = np.diff(offsets).astype("float32")
+        n = len(faiss_ids)
+        self.idf = np.log1p((n - counts + 0.5) / (counts + 0.5)).astype("float32")
+
+    def __len__(self) -> int:
+        return len(self.faiss_ids)
+
+    @classmethod
+    def build(cls, entries):
+        """Build from (faiss_id, text) pairs."""
+        postings = {}   # term -> ([positions], [term frequencies])
+        faiss_ids, doc_lengths = [], []
+        for position, (faiss_id, text) in enumerate(entries):
+            tokens = tokenize(text)
+            faiss_ids.append(faiss_id)
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(position)
+                tfs.append(count)
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        np.cumsum([len(postings[t][0]) for t in terms], out=offsets[1:])
+        total = int(offsets[-1])
+        doc_ids = np.fromiter((p for t in terms for p in postings[t][0]), dtype="int32", count=total)
+        tfs = np.fromiter((c for t in terms for c in postings[t][1]), dtype="float32", count=total)
+        return cls(terms, offsets, doc_ids, tfs, np.asarray(faiss_ids, dtype="int64"),
+                   np.asarray(doc_lengths, dtype="float32"))
+
+    def search(self, query: str, top_k: int = 5) -> list:
+        term_ids = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not term_ids or not len(self):
+            return []
+        spans = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in spans])
+        tf = np.concatenate([self.tfs[s] for s in spans])
+        idf = np.concatenate([np.full(s.stop - s.start, self.idf[t], dtype="float32") for s, t in zip(spans, term_ids)])
+
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[docs] / max(self.average_length, 1e-9))
+        scores = np.bincount(docs, weights=idf * tf * (BM25_K1 + 1) / (tf + norm), minlength=len(self))
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(self.faiss_ids[i]), float(scores[i])) for i in matched]
+
+    # ─── Persistence ─────────────
+    def save(self, path: str):
+        terms = "\n".join(sorted(self.vocab, key=self.vocab.get)).encode("utf-8")
+        with open(path, "wb") as f:
+            np.savez(f, terms=np.frombuffer(terms, dtype="uint8"), offsets=self.offsets, doc_ids=self.doc_ids,
+                     tfs=self.tfs, faiss_ids=self.faiss_ids, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            raw = data["terms"].tobytes().decode("utf-8")
+            return cls(raw.split("\n") if raw else [], data["offsets"], data["doc_ids"], data["tfs"],
+                       data["faiss_ids"], data["doc_lengths"])
+
+
+def entries_from_metadata(clauses: list):
+    """(faiss_id, text) pairs from clause metadata; older metadata without "faiss_id" is positional."""
+    return ((c.get("faiss_id", pos), c["text"]) for pos, c in enumerate(clauses))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the BM25 index from existing clause metadata.")
+    parser.add_argument("metadata", help="path to clause_metadata.bin (or a legacy clause_metadata.json)")
+    parser.add_argument("-o", "--output", help="default: clause_lexical.npz next to the metadata")
+    args = parser.parse_args()
+    lexical = LexicalIndex.build(entries_from_metadata(load_entries(args.metadata)))
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.metadata)), "clause_lexical.npz")
+    lexical.save(output)
+    print(f"✅ BM25 index: {len(lexical)} clauses, {len(lexical.vocab)} terms -> {output}")
@@ -0,0 +1,295 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+from telemetry import get_logger, registry
+
+# === CONFIG ===
+LLM_RPM_LIMIT = float(os.getenv("LLM_RPM_LIMIT", "3500"))          # provider requests/min; 0 disables
+LLM_TPM_LIMIT = float(os.getenv("LLM_TPM_LIMIT", "90000"))         # provider tokens/min (prompt + max_tokens); 0 disables
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_BACKOFF_FACTOR = float(os.getenv("LLM_BACKOFF_FACTOR", "0.5"))        # multiplicative decrease
+LLM_LATENCY_TOLERANCE = float(os.getenv("LLM_LATENCY_TOLERANCE", "2.0"))  # back off above this x baseline latency
+LLM_DEFAULT_RETRY_AFTER = 1.0     # seconds to pause on a 429 without a Retry-After header
+
+# Lower value = admitted first. Deadlines are seconds a call may wait for admission.
+PRIORITIES = {"interactive": 0, "export": 1, "batch": 2}
+ADMISSION_DEADLINES = {
+    "interactive": float(os.getenv("LLM_DEADLINE_INTERACTIVE", "10")),
+    "export": float(os.getenv("LLM_DEADLINE_EXPORT", "30")),
+    "batch": float(os.getenv("LLM_DEADLINE_BATCH", "600")),
+}
+
+log = get_logger("scheduler")
+admissions = registry.counter("accordly_llm_admissions", "LLM admission decisions by priority.",
+                              ("priority", "result"))
+admission_wait = registry.histogram("accordly_llm_admission_wait_seconds", "Time LLM calls waited for admission.",
+                                    ("priority",))
+
+
+class AdmissionRejected(Exception):
+    """An LLM call could not be admitted before its deadline; retry after `retry_after` seconds."""
+
+    def __init__(self, priority: str, retry_after: float):
+        super().__init__(f"LLM capacity exhausted for {priority} requests; retry in {math.ceil(retry_after)}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+# === TOKEN BUCKET ===
+class TokenBucket:
+    """`rate_per_min` units per minute, bursting up to one minute's worth. A rate of 0 never limits."""
+
+    def __init__(self, rate_per_min: float):
+        self.rate = rate_per_min / 60
+        self.capacity = rate_per_min
+        self.tokens = rate_per_min
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (capped at capacity) is available."""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float, now: float):
+        if self.rate:
+            self._refill(now)
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.rate and amount > 0:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# === SCHEDULER ===
+class Ticket:
+    """An admitted LLM call; pass it back to `LLMScheduler.release`."""
+
+    __slots__ = ("priority", "tokens", "admitted", "released")
+
+    def __init__(self, priority: str, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.admitted = time.monotonic()
+        self.released = False
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM client.
+
+    A call is admitted when a concurrency slot is free and the requests/min and
+    tokens/min buckets can pay for it. Waiting calls are served strictly by
+    priority class, then in arrival order. Calls that are not admitted
+    before their class deadline raise `AdmissionRejected`. If the buckets
+    alone already need longer than the deadline, the rejection is immediate.
+
+    The concurrency limit adapts AIMD-style. It grows by one slot per full
+    window of healthy completions. It is cut by LLM_BACKOFF_FACTOR on a 429
+    (which also pauses admissions for the Retry-After period), on a timeout,
+    or when smoothed latency exceeds LLM_LATENCY_TOLERANCE times its baseline.
+    At most one cut is made per smoothed-latency interval.
+    """
+
+    def __init__(self, rpm: float = LLM_RPM_LIMIT, tpm: float = LLM_TPM_LIMIT,
+                 min_concurrency: int = LLM_MIN_CONCURRENCY, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 initial_concurrency: int = LLM_INITIAL_CONCURRENCY, deadlines: dict = None):
+        self.requests = TokenBucket(rpm)
+        self.token_budget = TokenBucket(tpm)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.deadlines = deadlines or ADMISSION_DEADLINES
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency = None           # EWMA of call latency, seconds
+        self.baseline = None          # slow-moving low watermark of `latency`
+        self._last_decrease = 0.0
+        self._waiting = []            # heap of (priority, seq, future, ticket)
+        self._seq = itertools.count()
+        self._timer = None
+        self.rejected = 0
+        self.rate_limited = 0
+
+    # ─── Admission ─────────────────
+    async def acquire(self, priority: str = "interactive", tokens: int = 0, deadline: float = None) -> Ticket:
+        """Wait for admission; raises AdmissionRejected once `deadline` seconds (default: per class) pass."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+        deadline = self.deadlines[priority] if deadline is None else deadline
+        ticket = Ticket(priority, tokens)
+
+        bucket_wait = self._bucket_wait(tokens, time.monotonic())
+        if bucket_wait > deadline:
+            self._reject(priority, bucket_wait)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (PRIORITIES[priority], next(self._seq), future, ticket))
+        self._dispatch()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), deadline)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._reject(priority, self.retry_after())
+        except asyncio.CancelledError:
+            if not future.cancel():
+                self.release(future.result(), "cancelled")
+            raise
+        admission_wait.observe(time.monotonic() - started, priority=priority)
+        admissions.inc(priority=priority, result="admitted")
+        return future.result()
+
+    def _reject(self, priority: str, retry_after: float):
+        self.rejected += 1
+        admissions.inc(priority=priority, result="rejected")
+        raise AdmissionRejected(priority, max(retry_after, 1.0))
+
+    def _bucket_wait(self, tokens: int, now: float) -> float:
+        return max(self.paused_until - now, self.requests.wait_time(1, now), self.token_budget.wait_time(tokens, now))
+
+    def retry_after(self) -> float:
+        """Rough time until capacity frees up, for Retry-After headers."""
+        wait = self._bucket_wait(0, time.monotonic())
+        if self.latency is not None and self.in_flight >= int(self.limit):
+            wait = max(wait, self.latency)
+        return wait
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        while self._waiting:
+            _, _, future, ticket = self._waiting[0]
+            if future.done() or future.get_loop() is not loop:   # timed out, cancelled, or from a closed loop
+                heapq.heappop(self._waiting)
+                continue
+            if self.in_flight >= int(self.limit):
+                return                 # `release` dispatches again
+            wait = self._bucket_wait(ticket.tokens, now)
+            if wait > 0:
+                if self._timer is None or self._timer[0] is not loop:
+                    self._timer = (loop, loop.call_later(wait, self._on_timer))
+                return
+            heapq.heappop(self._waiting)
+            self.requests.take(1, now)
+            self.token_budget.take(ticket.tokens, now)
+            self.in_flight += 1
+            ticket.admitted = now
+            future.set_result(ticket)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    # ─── Feedback ──────────────────
+    def release(self, ticket: Ticket, outcome: str = "ok", retry_after: float = None, tokens_used: int = None):
+        """
+        Return a slot and feed the outcome into the concurrency limit.
+
+        `outcome` is "ok", "rate_limited", "timeout", "error" or "cancelled".
+        `tokens_used`, when known, refunds the unused part of the token estimate.
+        """
+        if ticket.released:
+            return
+        ticket.released = True
+        self.in_flight -= 1
+        now = time.monotonic()
+        if tokens_used is not None:
+            self.token_budget.refund(ticket.tokens - tokens_used)
+
+        if outcome == "rate_limited":
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, now + (retry_after or LLM_DEFAULT_RETRY_AFTER))
+            self._decrease(now, "rate_limited")
+        elif outcome == "timeout":
+            self._decrease(now, "timeout")
+        elif outcome == "ok":
+            self._observe_latency(now - ticket.admitted)
+            if self.latency > LLM_LATENCY_TOLERANCE * self.baseline:
+                self._decrease(now, "latency")
+            else:
+                self.limit = min(self.limit + 1 / self.limit, float(self.max_concurrency))
+        self._dispatch()
+
+    def _observe_latency(self, seconds: float):
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            # Creep towards the current level so a lasting shift becomes the new normal.
+            self.baseline += 0.01 * (self.latency - self.baseline)
+
+    def _decrease(self, now: float, reason: str):
+        if now - self._last_decrease < (self.latency or 1.0):
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(self.limit * LLM_BACKOFF_FACTOR, float(self.min_concurrency))
+        log.warning("llm concurrency reduced", extra={"reason": reason, "from": round(previous, 2),
+                                                      "to": round(self.limit, 2)})
+
+    @asynccontextmanager
+    async def admit(self, priority: str = "interactive", tokens: int = 0, deadline: float = None):
+        """`async with scheduler.admit(...) as ticket:` around one LLM call; the outcome is classified from errors."""
+        ticket = await self.acquire(priority, tokens, deadline)
+        try:
+            yield ticket
+        except BaseException as e:
+            self.release(ticket, *classify_error(e))
+            raise
+        else:
+            self.release(ticket, "ok")
+
+    def stats(self) -> dict:
+        waiting = {name: 0 for name in PRIORITIES}
+        for _, _, future, ticket in self._waiting:
+            if not future.done():
+                waiting[ticket.priority] += 1
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            **{f"waiting_{name}": count for name, count in waiting.items()},
+            "latency_ewma_s": round(self.latency, 4) if self.latency is not None else None,
+            "latency_baseline_s": round(self.baseline, 4) if self.baseline is not None else None,
+            "paused_for_s": round(max(self.paused_until - time.monotonic(), 0.0), 3),
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+        }
+
+
+def classify_error(error: BaseException) -> tuple:
+    """(outcome, retry_after) for `LLMScheduler.release` from an exception raised by an LLM call."""
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled", None
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout", None
+    if getattr(error, "status_code", None) == 429:
+        return "rate_limited", retry_after_seconds(error)
+    return "error", None
+
+
+def retry_after_seconds(error: BaseException):
+    """Retry-After of a provider error response in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+llm_scheduler = LLMScheduler()
@@ -1,15 +1,36 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Header, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+import os
+import json
+import math
+import secrets
+from typing import Optional
+import asyncio
 
-from gpt_utils import generate_contract
-from templates import nda_template
-from formatter import clean_contract_text, format_contract, format_sections, is_contract_ready
+from gpt_utils import (agenerate_contract, astream_contract, close_async_client, estimate_request_tokens,
+                       generation_cache, inflight_generations)
+from llm_scheduler import AdmissionRejected, llm_scheduler
+from formatter import format_contract, is_contract_ready, IncrementalFormatter
 from docx_exporter import export_to_docx, export_to_pdf
-from rag_utils import retrieve_relevant_clauses
+from artifact_store import artifact_store
+from rag_utils import retrieve_clauses_batch, retriever
+from jobs import JobManager, job_view
+from bulk_nda import parse_rows, retrieve_scopes, stream_bulk_zip
+from review_engine import reviewer, review_contract, split_clauses
+from upload_review import spool_upload, stream_upload_review, shutdown_extract_pool
+from prompt_builder import aget_encoding, usage_report
+from nda_pipeline import TITLE, EXPORT_FORMATS, build_nda_prompt, preview_nda, generate_export_text, render_export
+from telemetry import TelemetryMiddleware, get_logger, metrics_text, registry
+
+# === CONFIG ===
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")   # bearer token for /admin routes; unset disables them
 
 app = FastAPI()
+job_manager = JobManager()
+log = get_logger("api")
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,38 +39,182 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TelemetryMiddleware)
+
+
+def _gauges() -> dict:
+    sections = {
+        "generation_cache": generation_cache.stats(),
+        "single_flight": inflight_generations.stats(),
+        "query_embeddings": retriever.encoder.stats(),
+        "jobs": job_manager.metrics(),
+        "llm_scheduler": llm_scheduler.stats(),
+    }
+    return {
+        f"accordly_{section}_{name}": value
+        for section, stats in sections.items()
+        for name, value in stats.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+registry.add_collector(_gauges)
+
+@app.on_event("startup")
+async def startup():
+    # Load the embedding model, clause index and tokenizer before the first request arrives.
+    if os.getenv("RAG_WARM_UP", "1") == "1":
+        await asyncio.gather(asyncio.to_thread(retriever.warm_up), aget_encoding())
+    else:
+        await aget_encoding()
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_manager.stop()
+    await close_async_client()
+    shutdown_extract_pool()
 
 class PromptRequest(BaseModel):
     prompt: str
 
 class ClauseInput(BaseModel):
-    clause: str
+    clause: Optional[str] = None            # single clause (original API)
+    contract: Optional[str] = None          # whole contract, split with format_sections
+    clauses: Optional[list[str]] = None
+
+class JobRequest(BaseModel):
+    kind: str = "export_docx"
+    company_1: str
+    company_2: str
+    scope: str
+    jurisdiction: str = "USA"
+    effective_date: Optional[str] = None
+
+class BatchRetrievalRequest(BaseModel):
+    queries: list[str]
+    top_k: int = 3
+    score_threshold: Optional[float] = None
+    dedupe: bool = True
+    mode: Optional[str] = None              # dense | lexical | hybrid (default: RETRIEVAL_MODE)
+
+def export_response(fmt, data: bytes) -> Response:
+    _, media_type = EXPORT_FORMATS[fmt]
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="Non-Disclosure-Agreement.{fmt}"'}
+    )
+
+def overloaded(e: AdmissionRejected) -> HTTPException:
+    """503 for LLM calls the scheduler could not admit in time."""
+    return HTTPException(status_code=503, detail=f"❌ {str(e)}",
+                         headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 @app.get("/")
 async def home():
     return {"message": "Accordly API is live 🚀"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metrics_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "generation_cache": generation_cache.stats(),
+        "single_flight": inflight_generations.stats(),
+        "query_embeddings": retriever.encoder.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "artifacts": artifact_store.stats() if artifact_store is not None else None
+    }
+
 @app.post("/generate")
 async def generate_text(request: PromptRequest):
     try:
-        output = generate_contract(request.prompt)
+        output = await agenerate_contract(request.prompt)
         return {"contract": output}
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ GPT generation failed: {str(e)}")
 
+@app.post("/retrieve/batch")
+async def retrieve_batch(request: BatchRetrievalRequest):
+    try:
+        results = await asyncio.to_thread(
+            retrieve_clauses_batch, request.queries, request.top_k, request.score_threshold, request.dedupe,
+            request.mode
+        )
+        return {
+            "metric": retriever.score_kind(request.mode),
+            "results": [{"query": q, "clauses": r} for q, r in zip(request.queries, results)]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"❌ Clause retrieval failed: {str(e)}")
+
+def require_admin(authorization: Optional[str]):
+    """Admin routes are hidden unless ADMIN_TOKEN is set, and need it as a bearer token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest((authorization or "").encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="❌ Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.post("/admin/reload-index")
+async def reload_index(authorization: Optional[str] = Header(None)):
+    require_admin(authorization)
+    try:
+        await asyncio.to_thread(retriever.reload)
+        return {"reloaded": True}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"❌ Index reload failed: {str(e)}")
+
 @app.post("/api/review-clause")
 async def review_clause(data: ClauseInput):
+    if data.contract is not None or data.clauses is not None:
+        try:
+            return await asyncio.to_thread(review_contract, data.contract, data.clauses)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"❌ Clause review failed: {str(e)}")
+
+    if data.clause is None:
+        raise HTTPException(status_code=400, detail="❌ Provide clause, clauses or contract")
+
     clause = data.clause.lower()
     if "termination" in clause and "notice" in clause:
-        return {
+        response = {
             "result": "passed",
             "comment": "Clause includes proper notice period and termination procedures."
         }
     else:
-        return {
+        response = {
             "result": "failed",
             "comment": "Missing termination or notice details."
         }
+    try:
+        review = await asyncio.to_thread(reviewer.review, split_clauses(clauses=[data.clause]), False)
+        response["review"] = review["clauses"][0] if review["clauses"] else None
+    except Exception as e:
+        log.warning("semantic review unavailable", extra={"error": str(e)})
+    return response
+
+@app.post("/review/upload")
+async def review_upload(file: UploadFile = File(...)):
+    try:
+        path, sha256 = await spool_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ Invalid upload: {str(e)}")
+    return StreamingResponse(
+        stream_upload_review(path, sha256, file.filename or ""),
+        media_type="application/x-ndjson"
+    )
 
 @app.get("/generate/nda")
 async def generate_nda(
@@ -60,50 +225,89 @@ async def generate_nda(
     effective_date: str = None
 ):
     try:
-        rag_clauses = retrieve_relevant_clauses(scope, top_k=3)
-        rag_text = "\n\n".join([c["text"] for c in rag_clauses])
-        prompt = nda_template(company_1, company_2, scope, jurisdiction, effective_date, rag_text)
-
-        raw_output = generate_contract(prompt)
-        formatted_output = format_contract(raw_output)
-        clauses = format_sections(formatted_output)
-        is_ready = is_contract_ready(formatted_output)
+        return await preview_nda(company_1, company_2, scope, jurisdiction, effective_date)
+    except AdmissionRejected as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"❌ NDA generation failed: {str(e)}")
 
-        return {
-            "prompt_used": prompt,
-            "title": "NON-DISCLOSURE AGREEMENT",
-            "contract": formatted_output,
-            "clauses": clauses,
-            "is_ready": is_ready,
-            "effective_date": effective_date
-        }
+@app.get("/generate/nda/stream")
+async def generate_nda_stream(
+    company_1: str,
+    company_2: str,
+    scope: str,
+    jurisdiction: str = "USA",
+    effective_date: str = None
+):
+    try:
+        plan = await build_nda_prompt(company_1, company_2, scope, jurisdiction, effective_date)
+        # Admit before the 200 is sent, so an overloaded LLM still gets a 503 with Retry-After.
+        ticket = await llm_scheduler.acquire("interactive", estimate_request_tokens(plan["prompt"], plan["max_tokens"]))
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ NDA generation failed: {str(e)}")
 
+    async def events():
+        formatter = IncrementalFormatter()
+        parts = []
+        try:
+            async for delta in astream_contract(plan["prompt"], max_tokens=plan["max_tokens"], ticket=ticket):
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+                for clause in formatter.feed(delta):
+                    yield sse_event("clause", clause)
+            for clause in formatter.finish():
+                yield sse_event("clause", clause)
+
+            formatted_output = format_contract("".join(parts))
+            yield sse_event("done", {
+                "title": "NON-DISCLOSURE AGREEMENT",
+                "contract": formatted_output,
+                "is_ready": is_contract_ready(formatted_output),
+                "effective_date": effective_date,
+                "usage": usage_report(plan, "".join(parts))
+            })
+        except Exception as e:
+            yield sse_event("error", {"detail": f"❌ NDA generation failed: {str(e)}"})
+
+    async def release_unused_ticket():
+        # No-op once the stream has released it; covers clients that leave before streaming starts.
+        llm_scheduler.release(ticket, "cancelled")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_unused_ticket)
+    )
+
 @app.get("/export/nda-docx")
 async def export_nda_docx(
     company_1: str,
     company_2: str,
     scope: str,
     jurisdiction: str = "USA",
-    effective_date: str = None
+    effective_date: str = None,
+    save: bool = False
 ):
     try:
-        rag_clauses = retrieve_relevant_clauses(scope, top_k=3)
-        rag_text = "\n\n".join([c["text"] for c in rag_clauses])
-        prompt = nda_template(company_1, company_2, scope, jurisdiction, effective_date, rag_text)
+        formatted_output = await generate_export_text(company_1, company_2, scope, jurisdiction, effective_date)
 
-        raw_output = generate_contract(prompt)
-        cleaned_output = clean_contract_text(raw_output)
-        formatted_output = format_contract(cleaned_output)
+        if not save:
+            data = await render_export("docx", TITLE, formatted_output, company_1, company_2)
+            return export_response("docx", data)
 
-        file_path = export_to_docx("Non-Disclosure Agreement", formatted_output, company_1, company_2)
+        file_path = await asyncio.to_thread(export_to_docx, TITLE, formatted_output,
+                                            company_1=company_1, company_2=company_2)
 
         return FileResponse(
             path=file_path,
             filename="Non-Disclosure-Agreement.docx",
             media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
         )
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ DOCX export failed: {str(e)}")
 
@@ -113,23 +317,77 @@ async def export_nda_pdf(
     company_2: str,
     scope: str,
     jurisdiction: str = "USA",
-    effective_date: str = None
+    effective_date: str = None,
+    save: bool = False
 ):
     try:
-        rag_clauses = retrieve_relevant_clauses(scope, top_k=3)
-        rag_text = "\n\n".join([c["text"] for c in rag_clauses])
-        prompt = nda_template(company_1, company_2, scope, jurisdiction, effective_date, rag_text)
+        formatted_output = await generate_export_text(company_1, company_2, scope, jurisdiction, effective_date)
 
-        raw_output = generate_contract(prompt)
-        cleaned_output = clean_contract_text(raw_output)
-        formatted_output = format_contract(cleaned_output)
+        if not save:
+            data = await render_export("pdf", TITLE, formatted_output, company_1, company_2)
+            return export_response("pdf", data)
 
-        pdf_path = export_to_pdf("Non-Disclosure Agreement", formatted_output, company_1, company_2)
+        pdf_path = await asyncio.to_thread(export_to_pdf, TITLE, formatted_output,
+                                           company_1=company_1, company_2=company_2)
 
         return FileResponse(
             path=pdf_path,
             filename="Non-Disclosure-Agreement.pdf",
             media_type="application/pdf"
         )
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ PDF export failed: {str(e)}")
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    params = request.model_dump(exclude={"kind"})
+    try:
+        job_id = await job_manager.submit(request.kind, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ {str(e)}")
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/metrics")
+async def job_metrics():
+    return job_manager.metrics()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    job = await job_manager.wait(job_id, min(max(wait, 0), 30))
+    if job is None:
+        raise HTTPException(status_code=404, detail="❌ Job not found")
+    return job_view(job)
+
+@app.get("/jobs/{job_id}/artifact")
+async def get_job_artifact(job_id: str):
+    job = await asyncio.to_thread(job_manager.store.get, job_id, True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="❌ Job not found")
+    if job["status"] != "succeeded" or job["artifact"] is None:
+        raise HTTPException(status_code=409, detail=f"❌ Job has no artifact (status: {job['status']})")
+    fmt = "pdf" if job["media_type"] == "application/pdf" else "docx"
+    return export_response(fmt, job["artifact"])
+
+@app.post("/bulk/nda")
+async def bulk_nda(file: UploadFile = File(...), formats: str = "docx"):
+    try:
+        rows = parse_rows(await file.read(), file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"❌ Invalid bulk input: {str(e)}")
+    fmts = [f.strip().lower() for f in formats.split(",") if f.strip()]
+    unsupported = [f for f in fmts if f not in EXPORT_FORMATS]
+    if not fmts or unsupported:
+        raise HTTPException(status_code=400, detail=f"❌ Unsupported formats: {', '.join(unsupported) or formats}")
+    # Retrieve before the 200 is sent, so a retrieval failure is still a 500.
+    try:
+        rag_by_scope = await retrieve_scopes(rows)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"❌ Clause retrieval failed: {str(e)}")
+
+    return StreamingResponse(
+        stream_bulk_zip(rows, rag_by_scope, fmts),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="Non-Disclosure-Agreements.zip"'}
+    )
@@ -0,0 +1,67 @@
+import asyncio
+
+from gpt_utils import agenerate_contract
+from prompt_builder import PROMPT_CLAUSE_CANDIDATES, aget_encoding, build_nda_prompt_within_budget, usage_report
+from formatter import format_contract_with_sections, is_contract_ready
+from docx_exporter import render_docx, render_pdf
+from artifact_store import artifact_key, artifact_store
+from rag_utils import aretrieve_relevant_clauses
+
+# Shared NDA steps used by the HTTP handlers in main.py and by background jobs.
+
+TITLE = "Non-Disclosure Agreement"
+
+EXPORT_FORMATS = {
+    "docx": (render_docx, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "pdf": (render_pdf, "application/pdf"),
+}
+
+
+async def build_nda_prompt(company_1, company_2, scope, jurisdiction, effective_date) -> dict:
+    """Retrieve clauses for `scope` and assemble a token-budgeted prompt (see `prompt_builder`)."""
+    rag_clauses = await aretrieve_relevant_clauses(scope, top_k=PROMPT_CLAUSE_CANDIDATES)
+    await aget_encoding()
+    return build_nda_prompt_within_budget(company_1, company_2, scope, jurisdiction, effective_date, rag_clauses)
+
+
+async def preview_nda(company_1, company_2, scope, jurisdiction="USA", effective_date=None,
+                      priority="interactive") -> dict:
+    """Generate an NDA and return it formatted and split into tagged clauses."""
+    plan = await build_nda_prompt(company_1, company_2, scope, jurisdiction, effective_date)
+
+    raw_output = await agenerate_contract(plan["prompt"], max_tokens=plan["max_tokens"], priority=priority)
+    formatted_output, clauses = format_contract_with_sections(raw_output)
+    is_ready = is_contract_ready(formatted_output)
+
+    return {
+        "prompt_used": plan["prompt"],
+        "title": "NON-DISCLOSURE AGREEMENT",
+        "contract": formatted_output,
+        "clauses": clauses,
+        "is_ready": is_ready,
+        "effective_date": effective_date,
+        "usage": usage_report(plan, raw_output)
+    }
+
+
+async def generate_export_text(company_1, company_2, scope, jurisdiction="USA", effective_date=None,
+                               priority="export") -> str:
+    """Generate an NDA and return the formatted text used by the DOCX/PDF exports."""
+    plan = await build_nda_prompt(company_1, company_2, scope, jurisdiction, effective_date)
+
+    raw_output = await agenerate_contract(plan["prompt"], max_tokens=plan["max_tokens"], priority=priority)
+    return format_contract_with_sections(raw_output, double_clean=True)[0]
+
+
+async def render_export(fmt, title, formatted_output, company_1, company_2) -> bytes:
+    """Render an export in memory, reusing a stored artifact for identical inputs."""
+    render, _ = EXPORT_FORMATS[fmt]
+    key = artifact_key(title, formatted_output, company_1, company_2, fmt)
+    if artifact_store is not None:
+        data = await asyncio.to_thread(artifact_store.get, key)
+        if data is not None:
+            return data
+    data = await asyncio.to_thread(render, title, formatted_output, company_1, company_2)
+    if artifact_store is not None:
+        await asyncio.to_thread(artifact_store.put, key, data)
+    return data
@@ -0,0 +1,131 @@
+import os
+import asyncio
+import threading
+
+from gpt_utils import MODEL, SYSTEM_MESSAGE, MAX_TOKENS
+from templates import nda_template
+from lexical_index import tokenize
+from telemetry import get_logger, timed
+
+# === CONFIG ===
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "700"))              # input budget (system + user message)
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "16385"))          # prompt + completion limit of MODEL
+PROMPT_CLAUSE_CANDIDATES = int(os.getenv("PROMPT_CLAUSE_CANDIDATES", "3"))  # retrieved clauses to choose from
+PROMPT_MIN_SIMILARITY = float(os.getenv("PROMPT_MIN_SIMILARITY", "0.35"))   # cosine a clause needs to be considered
+PROMPT_DEDUPE_OVERLAP = float(os.getenv("PROMPT_DEDUPE_OVERLAP", "0.6"))    # share of a clause's words already in the prompt
+CHARS_PER_TOKEN = 4          # estimate used only when no tokenizer is available
+TOKENS_PER_MESSAGE = 3       # chat format overhead per message, plus 3 to prime the reply
+
+log = get_logger("prompt")
+
+_encoding_lock = threading.Lock()
+_encoding = None
+
+
+# === TOKEN COUNTING ===
+def get_encoding():
+    """tiktoken encoding for MODEL, loaded once; None (estimate from length) if it can't be loaded."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                try:
+                    _encoding = tiktoken.encoding_for_model(MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                log.warning("tokenizer unavailable; estimating tokens from length", extra={"error": str(e)})
+                _encoding = False
+        return _encoding or None
+
+
+async def aget_encoding():
+    """Like `get_encoding`, but the first load (which may download the BPE file) runs in a thread."""
+    if _encoding is None:
+        await asyncio.to_thread(get_encoding)
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(prompt: str) -> int:
+    """Tokens of the chat request `gpt_utils` sends: system message plus the prompt."""
+    return count_tokens(SYSTEM_MESSAGE) + count_tokens(prompt) + 3 * TOKENS_PER_MESSAGE
+
+
+def _words(text: str) -> set:
+    """Content words (BM25 tokens, stopwords removed) used to spot clauses the prompt already covers."""
+    return set(tokenize(text))
+
+
+# === PROMPT BUILDER ===
+@timed("prompt")
+def build_nda_prompt_within_budget(company_1, company_2, scope, jurisdiction, effective_date=None, clauses=(),
+                                   max_prompt_tokens: int = PROMPT_MAX_TOKENS,
+                                   max_completion_tokens: int = MAX_TOKENS) -> dict:
+    """
+    Render `nda_template` with as many retrieved clauses as the token budget allows.
+
+    `clauses` are retrieval results, best first. A clause is skipped when its
+    "similarity" to the scope is below PROMPT_MIN_SIMILARITY (lexical-only
+    hits carry none and are kept), or when PROMPT_DEDUPE_OVERLAP of its
+    content words already appear in the template or in a clause kept before
+    it, i.e. it restates a section the prompt has. Clauses are then added in
+    rank order while they fit in `max_prompt_tokens`, so the lowest-ranked
+    ones are trimmed first.
+    The completion cap is `max_completion_tokens`, reduced if needed to fit
+    the model's context window.
+
+    Returns the prompt, its token count, the completion cap (`max_tokens`) and
+    the number of clauses used and dropped.
+    """
+    base = nda_template(company_1, company_2, scope, jurisdiction, effective_date, "")
+    remaining = max_prompt_tokens - count_message_tokens(base)
+    seen = _words(base)
+    kept, low_score, duplicate, over_budget = [], 0, 0, 0
+
+    for clause in clauses:
+        text = (clause["text"] if isinstance(clause, dict) else clause).strip()
+        if not text:
+            continue
+        if isinstance(clause, dict) and clause.get("similarity", 1.0) < PROMPT_MIN_SIMILARITY:
+            low_score += 1
+            continue
+        words = _words(text)
+        if words and len(words & seen) >= PROMPT_DEDUPE_OVERLAP * len(words):
+            duplicate += 1
+            continue
+        cost = count_tokens(text) + 1   # plus the blank line between clauses
+        if cost > remaining:
+            over_budget += 1
+            continue
+        kept.append(text)
+        remaining -= cost
+        seen |= words
+
+    prompt = nda_template(company_1, company_2, scope, jurisdiction, effective_date, "\n\n".join(kept))
+    prompt_tokens = count_message_tokens(prompt)
+    return {
+        "prompt": prompt,
+        "prompt_tokens": prompt_tokens,
+        "max_tokens": max(min(max_completion_tokens, LLM_CONTEXT_WINDOW - prompt_tokens), 1),
+        "clauses_used": len(kept),
+        "clauses_dropped": {"low_score": low_score, "duplicate": duplicate, "over_budget": over_budget},
+    }
+
+
+def usage_report(plan: dict, completion: str) -> dict:
+    """Per-request token accounting for API responses."""
+    return {
+        "prompt_tokens": plan["prompt_tokens"],
+        "completion_tokens": count_tokens(completion),
+        "max_tokens": plan["max_tokens"],
+        "clauses_used": plan["clauses_used"],
+        "clauses_dropped": plan["clauses_dropped"],
+    }
@@ -1,25 +1,37 @@
 import os
 import re
 import json
+import argparse
+import hashlib
+import stat
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import faiss
 import numpy as np
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 from datetime import datetime
 
+from rag_utils import BASE_DIR, EMBED_MODEL, get_embedding_model
+from lexical_index import LexicalIndex, entries_from_metadata
+from clause_store import ClauseStore, TextSpool, load_entries, write_clause_store
+from utils import extract_text_from_file
+
 # === CONFIG ===
-DATA_DIR = "./data/clauses"          # ✅ Adjusted path to current structure
-INDEX_DIR = "./data/faiss_index"
+DATA_DIR = os.path.join(BASE_DIR, "data", "clauses")
+INDEX_DIR = os.path.join(BASE_DIR, "data", "faiss_index")
+INDEX_FILE = "clause_index.faiss"
+METADATA_FILE = "clause_metadata.bin"
+LEGACY_METADATA_FILE = "clause_metadata.json"   # read once and migrated to METADATA_FILE
+MANIFEST_FILE = "index_manifest.json"
+LEXICAL_FILE = "clause_lexical.npz"
 CHUNK_SIZE = 500
-EMBED_MODEL = "all-MiniLM-L6-v2"
-
-# === SETUP ===
-os.makedirs(INDEX_DIR, exist_ok=True)
-model = SentenceTransformer(EMBED_MODEL)
-index = faiss.IndexFlatL2(384)
+ENCODE_BATCH = 64
+INDEX_FACTORY = "Flat"     # e.g. "IVF1024,Flat", "IVF1024,PQ48", "HNSW32"
+METRIC = "l2"              # "ip" = cosine similarity on normalized embeddings
+TRAIN_SIZE = 50000         # max vectors used to train IVF/PQ indexes
+SOURCE_EXTENSIONS = {".txt", ".docx", ".pdf"}
 
-clause_db = []
-vectors = []
 
 def chunk_text(text, size):
     chunks = []
@@ -34,43 +46,327 @@ def chunk_text(text, size):
         chunks.append(current.strip())
     return chunks
 
-# === INDEXING LOOP ===
-doc_id = 0
-for filename in tqdm(os.listdir(DATA_DIR), desc="🔍 Indexing clauses"):
-    if not filename.endswith(".txt"):
-        continue
-    file_path = os.path.join(DATA_DIR, filename)
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = f.read().strip()
-        if not text:
-            print(f"⚠️ Skipping empty file: {filename}")
-            continue
+
+def chunk_hash(source: str, text: str) -> str:
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+
+# === ATOMIC WRITES ===
+def _atomic_replace(path: str, write):
+    """Write via a temp file in the same directory, then rename over `path`."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_", suffix=os.path.basename(path))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, _replacement_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _replacement_mode(path: str) -> int:
+    """Permissions for a file replacing `path`: the target's, or 0644 under the umask (mkstemp creates 0600)."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o644 & ~umask
+
+
+def write_json_atomic(path: str, data):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    _atomic_replace(path, write)
+
+
+def write_index_atomic(index, path: str):
+    _atomic_replace(path, lambda tmp_path: faiss.write_index(index, tmp_path))
+
+
+def write_lexical_atomic(clause_db: list, path: str):
+    lexical = LexicalIndex.build(entries_from_metadata(clause_db))
+    _atomic_replace(path, lexical.save)
+    return lexical
+
+
+# === INDEX FACTORY ===
+def make_index(dim: int, factory: str = INDEX_FACTORY, metric: str = METRIC):
+    """Create an ID-mapped FAISS index from a factory string (see faiss.index_factory)."""
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+    return faiss.IndexIDMap(faiss.index_factory(dim, factory, faiss_metric))
+
+
+def prepare_vectors(embeddings, metric: str = METRIC) -> np.ndarray:
+    vectors = np.ascontiguousarray(embeddings, dtype="float32")
+    if metric == "ip":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def train_and_add(index, pending: list):
+    """Train `index` on the buffered (embeddings, ids) batches, then add them."""
+    sample = np.vstack([e for e, _ in pending])
+    print(f"🏋️ Training index on {len(sample)} vectors")
+    index.train(sample)
+    for embeddings, ids in pending:
+        index.add_with_ids(embeddings, ids)
+
+
+# === MANIFEST ===
+def metadata_path(index_dir: str):
+    """The clause store, else a legacy JSON metadata file, else None."""
+    for name in (METADATA_FILE, LEGACY_METADATA_FILE):
+        path = os.path.join(index_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def previous_texts(path: str):
+    """faiss_id -> text over existing clause metadata; memory-mapped unless it is legacy JSON."""
+    if path.endswith(".json"):
+        return {c["faiss_id"]: c["text"] for c in load_entries(path)}.__getitem__
+    return ClauseStore(path).text
+
+
+def load_manifest(index_dir: str):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# === INGESTION ===
+def iter_source_files(data_dir: str):
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if os.path.splitext(filename)[1].lower() in SOURCE_EXTENSIONS:
+                yield os.path.join(root, filename)
+
+
+def extract_chunks(file_path: str, data_dir: str) -> list:
+    """Extract and chunk one source file into (hash, source, text) records. Runs in a worker process."""
+    source = os.path.relpath(file_path, data_dir).replace(os.sep, "/")
+    try:
+        text = extract_text_from_file(file_path).strip()
+    except Exception as e:
+        print(f"⚠️ Could not read {source}: {e}")
+        return []
+    if not text:
+        print(f"⚠️ Skipping empty file: {source}")
+        return []
 
     chunks = chunk_text(text, CHUNK_SIZE)
     if not chunks:
-        print(f"⚠️ No valid chunks in: {filename}")
-        continue
-
-    embeddings = model.encode(chunks, convert_to_numpy=True)  # ✅ Explicit numpy array
-
-    for chunk, embed in zip(chunks, embeddings):
-        clause_db.append({
-            "id": f"{doc_id}_{filename}",
-            "text": chunk
-        })
-        vectors.append(embed)
-    doc_id += 1
-
-# === FINAL STEP ===
-if vectors:
-    vectors_np = np.array(vectors).astype('float32')
-    index.add(vectors_np)
-
-    faiss.write_index(index, os.path.join(INDEX_DIR, "clause_index.faiss"))
-    with open(os.path.join(INDEX_DIR, "clause_metadata.json"), "w", encoding="utf-8") as f:
-        json.dump(clause_db, f, indent=2)
-
-    print(f"\n✅ Indexed {len(clause_db)} clauses from {doc_id} documents.")
-    print(f"📦 FAISS index shape: {vectors_np.shape}")
-else:
-    print("❌ No valid clauses found. Index not saved.")
+        print(f"⚠️ No valid chunks in: {source}")
+    return [{"hash": chunk_hash(source, chunk), "source": source, "text": chunk} for chunk in chunks if chunk]
+
+
+def iter_chunks(data_dir: str, workers: int = None):
+    """
+    Yield chunk records for every supported file under `data_dir`.
+
+    Text extraction (PDF parsing is CPU-bound) runs in a process pool. Only a
+    few files per worker are in flight at a time, so memory stays bounded by
+    the window rather than by corpus size. Files are yielded in walk order.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for file_path in iter_source_files(data_dir):
+            in_flight.append(pool.submit(extract_chunks, file_path, data_dir))
+            if len(in_flight) >= workers * 4:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+class EmbeddingBatcher:
+    """
+    Encode chunks in fixed-size batches and add each batch to the index straight away.
+
+    Embeddings are copied into one preallocated float32 buffer, so memory use
+    does not grow with the corpus. Until an index is trained, up to
+    `train_size` vectors are held back, used for training, then added.
+    """
+
+    def __init__(self, model, index, metric: str, next_id: int, batch_size: int = ENCODE_BATCH,
+                 train_size: int = TRAIN_SIZE):
+        self.model = model
+        self.index = index
+        self.metric = metric
+        self.next_id = next_id
+        self.batch_size = batch_size
+        self.train_size = train_size
+        self.buffer = np.empty((batch_size, model.get_sentence_embedding_dimension()), dtype="float32")
+        self.texts = []
+        self.untrained = []
+        self.added = 0
+
+    def add(self, text: str) -> int:
+        """Queue one chunk; returns the FAISS id it will be stored under."""
+        faiss_id = self.next_id
+        self.next_id += 1
+        self.texts.append(text)
+        if len(self.texts) == self.batch_size:
+            self.flush()
+        return faiss_id
+
+    def flush(self):
+        count = len(self.texts)
+        if not count:
+            return
+        vectors = self.buffer[:count]
+        vectors[:] = self.model.encode(self.texts, batch_size=self.batch_size, convert_to_numpy=True)
+        if self.metric == "ip":
+            faiss.normalize_L2(vectors)
+        ids = np.arange(self.next_id - count, self.next_id, dtype="int64")
+        self.texts = []
+        self.added += count
+
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors, ids)
+            return
+        self.untrained.append((vectors.copy(), ids))
+        if sum(len(i) for _, i in self.untrained) >= self.train_size:
+            self._train()
+
+    def finish(self):
+        """Flush the last partial batch and train on whatever sample was collected."""
+        self.flush()
+        if self.untrained:
+            self._train()
+
+    def _train(self):
+        train_and_add(self.index, self.untrained)
+        self.untrained = []
+
+
+def build_index(data_dir: str = DATA_DIR, index_dir: str = INDEX_DIR, model_name: str = EMBED_MODEL,
+                full: bool = False, factory: str = INDEX_FACTORY, metric: str = METRIC,
+                train_size: int = TRAIN_SIZE, workers: int = None):
+    """
+    Bring the clause index in line with `data_dir`.
+
+    Every .txt/.docx/.pdf file under `data_dir` (recursively) is extracted in
+    a process pool, chunked and streamed through `EmbeddingBatcher`.
+
+    Chunks are identified by a content hash recorded in the manifest. Only new
+    or changed chunks are embedded; chunks that disappeared are removed from
+    the ID-mapped index. `full=True` (or a missing manifest) rebuilds from
+    scratch. Index, clause store, BM25 index and manifest are each replaced
+    atomically, FAISS index last, so a live `ClauseRetriever` can hot-reload
+    on the index mtime. The BM25 index is rebuilt over the final metadata.
+
+    New chunk texts are spooled to a temp file as they are embedded, and
+    kept ones are read back from the existing clause store, so the build
+    holds ids and offsets in memory rather than the corpus text.
+
+    `factory` and `metric` choose the index type. Indexes that need training
+    (IVF, PQ) are trained on up to `train_size` of the first embedded chunks.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    model = get_embedding_model(model_name)
+    dim = model.get_sentence_embedding_dimension()
+
+    manifest = None if full else load_manifest(index_dir)
+    settings = {"model": model_name, "dim": dim, "factory": factory, "metric": metric}
+    if manifest is not None and any(manifest.get(k) != v for k, v in settings.items()):
+        print("⚠️ Embedding model or index settings changed; rebuilding index from scratch")
+        manifest = None
+
+    previous_text = None
+    if manifest is None:
+        index = make_index(dim, factory, metric)
+        manifest = {**settings, "next_id": 0, "chunks": {}}
+    else:
+        index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+        previous_text = previous_texts(metadata_path(index_dir))
+
+    with TextSpool(index_dir) as new_texts:
+        known = manifest["chunks"]
+        seen = set()
+        batcher = EmbeddingBatcher(model, index, metric, manifest["next_id"], train_size=train_size)
+        new_count = 0
+
+        # ─── Stream and embed new chunks ─
+        for record in tqdm(iter_chunks(data_dir, workers), desc="🧠 Indexing chunks", unit="chunk"):
+            if record["hash"] in seen:
+                continue
+            seen.add(record["hash"])
+            if record["hash"] in known:
+                continue
+            faiss_id = batcher.add(record["text"])
+            known[record["hash"]] = {"faiss_id": faiss_id, "source": record["source"]}
+            new_texts.add(faiss_id, record["text"])
+            new_count += 1
+        batcher.finish()
+        manifest["next_id"] = batcher.next_id
+
+        # ─── Remove stale chunks ───────
+        stale = [h for h in known if h not in seen]
+        if stale:
+            try:
+                index.remove_ids(np.array([known[h]["faiss_id"] for h in stale], dtype="int64"))
+            except RuntimeError:
+                # Some index types (e.g. HNSW) can't delete vectors; start over instead.
+                print("⚠️ Index type does not support removal; rebuilding from scratch")
+                return build_index(data_dir, index_dir, model_name, True, factory, metric, train_size, workers)
+            for h in stale:
+                new_texts.discard(known.pop(h)["faiss_id"])
+
+        if not known:
+            print("❌ No valid clauses found. Index not saved.")
+            return
+
+        existing = metadata_path(index_dir)
+        if not stale and not new_count and existing is not None:
+            if existing.endswith(".json"):
+                write_clause_store(os.path.join(index_dir, METADATA_FILE), load_entries(existing))
+                print("📦 Migrated JSON metadata to the clause store.")
+            if not os.path.exists(os.path.join(index_dir, LEXICAL_FILE)):
+                write_lexical_atomic(ClauseStore(os.path.join(index_dir, METADATA_FILE)).entries(),
+                                     os.path.join(index_dir, LEXICAL_FILE))
+                print("🔤 Built missing BM25 index.")
+            print("✅ Index is up to date.")
+            return
+
+        # === FINAL STEP ===
+        def text(faiss_id):
+            return new_texts.text(faiss_id) if faiss_id in new_texts else previous_text(faiss_id)
+
+        clause_db = (
+            {"faiss_id": c["faiss_id"], "id": f"{c['faiss_id']}_{c['source']}", "text": text(c["faiss_id"])}
+            for c in sorted(known.values(), key=lambda c: c["faiss_id"])
+        )
+        manifest["updated"] = datetime.now().isoformat(timespec="seconds")
+
+        store_path = os.path.join(index_dir, METADATA_FILE)
+        write_clause_store(store_path, clause_db)
+        lexical = write_lexical_atomic(ClauseStore(store_path).entries(), os.path.join(index_dir, LEXICAL_FILE))
+        write_json_atomic(os.path.join(index_dir, MANIFEST_FILE), manifest)
+        write_index_atomic(index, os.path.join(index_dir, INDEX_FILE))
+
+        print(f"\n✅ Indexed {len(known)} clauses (+{new_count} new, -{len(stale)} stale).")
+        print(f"📦 FAISS index size: {index.ntotal} x {dim}")
+        print(f"🔤 BM25 index: {len(lexical.vocab)} terms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the clause FAISS index.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of updating incrementally")
+    parser.add_argument("--index-factory", default=INDEX_FACTORY, help='FAISS factory string, e.g. "IVF1024,PQ48" or "HNSW32"')
+    parser.add_argument("--metric", choices=["l2", "ip"], default=METRIC, help="ip = cosine on normalized embeddings")
+    parser.add_argument("--train-size", type=int, default=TRAIN_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    args = parser.parse_args()
+    build_index(args.data_dir, args.index_dir, full=args.full, factory=args.index_factory,
+                metric=args.metric, train_size=args.train_size, workers=args.workers)
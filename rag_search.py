@@ -1,34 +1,14 @@
-import os
-import json
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
+import sys
 
-# Paths
-INDEX_DIR = "../data/faiss_index"
-EMBED_MODEL = "all-MiniLM-L6-v2"
+from rag_utils import retriever
 
-# Load index + metadata
-index = faiss.read_index(os.path.join(INDEX_DIR, "clause_index.faiss"))
-with open(os.path.join(INDEX_DIR, "clause_metadata.json"), "r", encoding="utf-8") as f:
-    clause_db = json.load(f)
-
-# Load embedding model
-model = SentenceTransformer(EMBED_MODEL)
 
 def retrieve_relevant_clauses(query: str, top_k: int = 5):
-    query_embedding = model.encode([query])
-    D, I = index.search(np.array(query_embedding), top_k)
-
-    results = []
-    for i in I[0]:
-        results.append(clause_db[i]["text"])
-
-    return results
+    return [clause["text"] for clause in retriever.search(query, top_k)]
 
 
 if __name__ == "__main__":
-    query = "confidential exchange of AI model architecture"
+    query = " ".join(sys.argv[1:]) or "confidential exchange of AI model architecture"
     top_clauses = retrieve_relevant_clauses(query)
 
     print("Top Relevant Clauses:\n")
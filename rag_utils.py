@@ -1,28 +1,488 @@
 import os
-import faiss
 import json
-from sentence_transformers import SentenceTransformer
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+
+from lexical_index import LexicalIndex
+from clause_store import ClauseStore
+from telemetry import get_logger, stage, timed
 
 # === CONFIG ===
-INDEX_PATH = "./data/faiss_index/clause_index.faiss"
-METADATA_PATH = "./data/faiss_index/clause_metadata.json"
-EMBED_MODEL = "all-MiniLM-L6-v2"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.getenv("CLAUSE_INDEX_PATH", os.path.join(BASE_DIR, "data", "faiss_index", "clause_index.faiss"))
+METADATA_PATH = os.getenv("CLAUSE_METADATA_PATH", os.path.join(BASE_DIR, "data", "faiss_index", "clause_metadata.bin"))
+EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+INDEX_MMAP = os.getenv("CLAUSE_INDEX_MMAP", "0") == "1"   # share index pages between workers
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))           # cached query embeddings
+ENCODE_BATCH_WINDOW = float(os.getenv("ENCODE_BATCH_WINDOW_MS", "5")) / 1000
+ENCODE_MAX_BATCH = int(os.getenv("ENCODE_MAX_BATCH", "64"))
+INDEX_NPROBE = int(os.getenv("CLAUSE_INDEX_NPROBE", "0"))          # IVF lists probed per query (0 = index default)
+INDEX_EF_SEARCH = int(os.getenv("CLAUSE_INDEX_EF_SEARCH", "0"))    # HNSW search depth (0 = index default)
+RELOAD_INTERVAL = float(os.getenv("CLAUSE_INDEX_RELOAD_INTERVAL", "5"))  # seconds between index mtime checks; 0 disables
+LEXICAL_PATH = os.getenv("CLAUSE_LEXICAL_PATH", os.path.join(BASE_DIR, "data", "faiss_index", "clause_lexical.npz"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")      # dense | lexical | hybrid
+RRF_K = int(os.getenv("RRF_K", "60"))                       # reciprocal-rank fusion constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # min candidates per ranking before fusion
+HYBRID_MIN_SIMILARITY = float(os.getenv("HYBRID_MIN_SIMILARITY", "0.3"))  # cosine a dense-only hit needs to be fused
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+log = get_logger("rag")
+
+_model_lock = threading.Lock()
+_models = {}
+
+
+def get_embedding_model(name: str = EMBED_MODEL):
+    """Load a SentenceTransformer once per process and share it between callers."""
+    with _model_lock:
+        if name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[name] = SentenceTransformer(name)
+        return _models[name]
+
+
+def dense_similarity(scores, higher_is_better: bool):
+    """
+    Cosine similarity of FAISS scores.
+
+    Inner-product indexes hold normalized vectors, so their scores already are.
+    L2 indexes return squared distances, which for the unit-length embeddings
+    sentence-transformers models like MiniLM emit equal 2 - 2 * cosine.
+    """
+    return scores if higher_is_better else 1.0 - scores / 2.0
+
+
+def normalize_query(query: str) -> str:
+    # Spacing never changes the embedding, but case does for cased models, so it is kept.
+    return " ".join(query.split())
+
+
+# === QUERY ENCODER ===
+class BatchingEncoder:
+    """
+    LRU cache of query embeddings in front of a micro-batching encoder.
+
+    Concurrent `encode()` calls that miss the cache are collected for up to
+    `window` seconds (or `max_batch` queries), encoded with one `model.encode`
+    call in a worker thread, and the vectors are fanned back out to the callers.
+    Duplicate queries within a window share one slot in the batch.
+    """
+
+    def __init__(self, encode_fn, cache_size: int = QUERY_CACHE_SIZE,
+                 window: float = ENCODE_BATCH_WINDOW, max_batch: int = ENCODE_MAX_BATCH):
+        self._encode_fn = encode_fn
+        self.cache_size = cache_size
+        self.window = window
+        self.max_batch = max_batch
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending = {}
+        self._flush_handle = None
+        self._tasks = set()   # running batches, referenced until done so they aren't collected
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    def lookup(self, key: str):
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return vector
 
-# === LOAD MODEL AND INDEX ===
-model = SentenceTransformer(EMBED_MODEL)
-index = faiss.read_index(INDEX_PATH)
+    def store(self, key: str, vector: np.ndarray):
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode_sync(self, queries: list) -> np.ndarray:
+        """Blocking encode through the cache; returns one row per query."""
+        keys = [normalize_query(q) for q in queries]
+        found = {k: self.lookup(k) for k in set(keys)}
+        missing = [k for k, vector in found.items() if vector is None]
+        if missing:
+            self.misses += len(missing)
+            self.batches += 1
+            for k, vector in zip(missing, self._encode_fn(missing)):
+                self.store(k, vector)
+                found[k] = vector
+        return np.vstack([found[k] for k in keys])
+
+    async def encode(self, query: str) -> np.ndarray:
+        key = normalize_query(query)
+        vector = self.lookup(key)
+        if vector is not None:
+            return vector
+
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict):
+        keys = list(batch)
+        self.misses += len(keys)
+        self.batches += 1
+        try:
+            vectors = await asyncio.to_thread(self._encode_fn, keys)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, vector in zip(keys, vectors):
+            self.store(key, vector)
+            if not batch[key].done():
+                batch[key].set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "batches": self.batches,
+            "cached": len(self._cache),
+        }
 
-# === LOAD METADATA ===
-with open(METADATA_PATH, "r", encoding="utf-8") as f:
-    metadata = json.load(f)
 
 # === RAG CLAUSE RETRIEVER ===
-def retrieve_relevant_clauses(query: str, top_k: int = 5):
-    embedding = model.encode([query])
-    scores, indices = index.search(embedding, top_k)
-
-    results = []
-    for idx in indices[0]:
-        if 0 <= idx < len(metadata):
-            results.append(metadata[idx])
-    return results
+class ClauseRetriever:
+    """
+    Process-wide clause search engine.
+
+    Nothing is loaded at import time: the embedding model, FAISS index and
+    metadata are loaded on first use (or by `warm_up()`), exactly once, under a
+    lock. With `mmap=True` the index is opened with IO_FLAG_MMAP so uvicorn
+    workers share its pages through the OS page cache instead of each holding
+    a private copy.
+
+    Searches run in `mode` "dense" (FAISS), "lexical" (BM25 over the same
+    chunks) or "hybrid" (both, fused by reciprocal rank). Without a BM25 index
+    on disk every mode falls back to dense.
+    """
+
+    def __init__(self, index_path: str = INDEX_PATH, metadata_path: str = METADATA_PATH,
+                 model_name: str = EMBED_MODEL, mmap: bool = INDEX_MMAP, reload_interval: float = RELOAD_INTERVAL,
+                 lexical_path: str = LEXICAL_PATH, mode: str = RETRIEVAL_MODE):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.lexical_path = lexical_path
+        self.mode = mode
+        self.model_name = model_name
+        self.mmap = mmap
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._model = None
+        self._state = None          # (index, clause store by FAISS id, index mtime, BM25 index), swapped atomically;
+                                    # a query reads it once and passes that snapshot down
+        self._last_reload_check = 0.0
+        self.encoder = BatchingEncoder(self.encode)
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    def warm_up(self):
+        """Load model, index and metadata now (e.g. from a FastAPI startup hook)."""
+        self._ensure_loaded()
+        return self
+
+    def _ensure_loaded(self):
+        if self._state is not None:
+            if self._reload_due():
+                self.maybe_reload()
+            return
+        with self._lock:
+            if self._state is not None:
+                return
+            self._model = get_embedding_model(self.model_name)
+            self._state = self._read_state()
+            self._last_reload_check = time.monotonic()
+
+    def _reload_due(self) -> bool:
+        return bool(self.reload_interval) and time.monotonic() - self._last_reload_check > self.reload_interval
+
+    def maybe_reload(self) -> bool:
+        """Hot-reload index and metadata if the index file was replaced since it was loaded."""
+        self._last_reload_check = time.monotonic()
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return False
+        if self._state is not None and mtime == self._state[2]:
+            return False
+        return self.reload()
+
+    def reload(self) -> bool:
+        """Load the index and metadata from disk and swap them in for new searches."""
+        with self._lock:
+            if self._model is None:
+                self._model = get_embedding_model(self.model_name)
+            self._state = self._read_state()
+            self._last_reload_check = time.monotonic()
+        log.info("clause index loaded", extra={"vectors": self._state[0].ntotal})
+        return True
+
+    def _read_state(self):
+        mtime = os.stat(self.index_path).st_mtime_ns
+        index = self._read_index()
+        metadata = self._read_metadata()
+        lexical = LexicalIndex.load(self.lexical_path) if os.path.exists(self.lexical_path) else None
+        return index, metadata, mtime, lexical
+
+    def _read_metadata(self):
+        """The memory-mapped clause store; a legacy JSON list is loaded into a dict instead."""
+        path = self.metadata_path
+        legacy = os.path.splitext(path)[0] + ".json"
+        if not os.path.exists(path) and os.path.exists(legacy):
+            log.warning("loading legacy clause metadata", extra={"path": legacy, "fix": f"python clause_store.py migrate {legacy}"})
+            path = legacy
+        if not path.endswith(".json"):
+            return ClauseStore(path)
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        # Indexes built with IDs (rag_indexer) record "faiss_id"; older ones are positional.
+        return {entry.get("faiss_id", pos): entry for pos, entry in enumerate(entries)}
+
+    def _read_index(self):
+        index = None
+        if self.mmap:
+            try:
+                index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                # Not every index type supports mmap; fall back to a private copy.
+                log.warning("mmap read failed; loading index into memory", extra={"error": str(e)})
+        if index is None:
+            index = faiss.read_index(self.index_path)
+        self._apply_search_params(index)
+        return index
+
+    def _apply_search_params(self, index):
+        params = faiss.ParameterSpace()
+        for name, value in (("nprobe", INDEX_NPROBE), ("efSearch", INDEX_EF_SEARCH)):
+            if value:
+                try:
+                    params.set_index_parameter(index, name, value)
+                except RuntimeError:
+                    pass  # parameter doesn't apply to this index type
+
+    def encode(self, queries: list) -> np.ndarray:
+        self._ensure_loaded()
+        with stage("embed"):
+            return np.asarray(self._model.encode(queries, convert_to_numpy=True), dtype="float32")
+
+    @property
+    def index_version(self) -> int:
+        """mtime of the loaded index file; changes whenever a new index is swapped in."""
+        self._ensure_loaded()
+        return self._state[2]
+
+    @property
+    def higher_is_better(self) -> bool:
+        """True when dense scores are similarities (inner product), False for L2 distances."""
+        self._ensure_loaded()
+        return self._state[0].metric_type == faiss.METRIC_INNER_PRODUCT
+
+    def iter_clauses(self):
+        """Every stored clause ({"faiss_id", "id", "text"}) of the loaded index."""
+        self._ensure_loaded()
+        metadata = self._state[1]
+        return metadata.entries() if isinstance(metadata, ClauseStore) else iter(metadata.values())
+
+    def resolve_mode(self, mode: str = None) -> str:
+        return self._resolve_mode(mode, self._snapshot(mode))
+
+    def _snapshot(self, mode: str = None):
+        """Validate `mode`, then return the current state for one query to use throughout."""
+        mode = mode or self.mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        self._ensure_loaded()
+        return self._state
+
+    def _resolve_mode(self, mode: str, state) -> str:
+        mode = mode or self.mode
+        return mode if state[3] is not None else "dense"
+
+    def score_kind(self, mode: str = None) -> str:
+        """What "score" means in results for `mode`."""
+        mode = self.resolve_mode(mode)
+        if mode == "dense":
+            return "inner_product" if self.higher_is_better else "l2"
+        return "bm25" if mode == "lexical" else "rrf"
+
+    def search(self, query: str, top_k: int = 5, score_threshold: float = None, mode: str = None) -> list:
+        return self.search_batch([query], top_k, score_threshold, False, mode)[0]
+
+    @timed("retrieve")
+    async def asearch(self, query: str, top_k: int = 5, score_threshold: float = None, mode: str = None) -> list:
+        """Like `search`, but encodes via the batching encoder and searches off the event loop."""
+        if not self.loaded or self._reload_due():
+            await asyncio.to_thread(self._ensure_loaded)
+        state = self._snapshot(mode)
+        mode = self._resolve_mode(mode, state)
+        embeddings = None if mode == "lexical" else (await self.encoder.encode(query)).reshape(1, -1)
+        results = await asyncio.to_thread(self._search, state, [query], embeddings, top_k, score_threshold, False, mode)
+        return results[0]
+
+    @timed("retrieve")
+    def search_batch(self, queries: list, top_k: int = 5, score_threshold: float = None,
+                     dedupe: bool = False, mode: str = None) -> list:
+        """
+        Search several queries with one encode and one `index.search` call.
+
+        Returns one list of clauses (with "score") per query, best first.
+        `score_threshold` is a maximum distance for L2 indexes and a minimum
+        similarity for inner-product indexes. It always applies to the dense
+        score: hybrid results are fused first and then kept only if their
+        dense score passes, so lexical-only matches are dropped. Lexical mode
+        has no dense score and ignores it.
+        In hybrid mode a candidate needs a lexical match or a dense cosine of
+        at least HYBRID_MIN_SIMILARITY to be fused at all, so an off-topic
+        query can return fewer than `top_k` clauses. Dense-scored results
+        carry that cosine as "similarity".
+        With `dedupe`, a clause matched by several queries is kept only for
+        the query it scores best on.
+        """
+        state = self._snapshot(mode)
+        mode = self._resolve_mode(mode, state)
+        if not queries:
+            return []
+        embeddings = None if mode == "lexical" else self.encoder.encode_sync(queries)
+        return self._search(state, queries, embeddings, top_k, score_threshold, dedupe, mode)
+
+    @timed("retrieve")
+    def search_embeddings(self, embeddings: np.ndarray, top_k: int = 5, score_threshold: float = None) -> list:
+        """Dense search with already-encoded vectors (one row per query)."""
+        self._ensure_loaded()
+        return self._search_vectors(self._state, embeddings, top_k, score_threshold)
+
+    def _search(self, state, queries: list, embeddings, top_k: int, score_threshold, dedupe: bool, mode: str) -> list:
+        if mode == "dense":
+            return self._search_vectors(state, embeddings, top_k, score_threshold, dedupe)
+
+        index, metadata, _, lexical = state
+        depth = top_k if mode == "lexical" else max(top_k * 4, HYBRID_CANDIDATES)
+        lexical_hits = [lexical.search(query, depth) for query in queries]
+        if mode == "lexical":
+            ranked = [[(faiss_id, {"score": score}) for faiss_id, score in hits] for hits in lexical_hits]
+        else:
+            higher_is_better = index.metric_type == faiss.METRIC_INNER_PRODUCT
+            scores, indices, keep = self._dense_hits(index, embeddings, depth)
+            similarity = dense_similarity(scores, higher_is_better)
+            ranked = []
+            for row, hits in enumerate(lexical_hits):
+                # Every fused candidate earns an RRF share by rank alone, so a clause with
+                # no lexical match only enters when it is similar enough to the query.
+                matched = {faiss_id for faiss_id, _ in hits}
+                dense = [(int(i), float(s)) for i, s, sim in zip(indices[row][keep[row]], scores[row][keep[row]],
+                                                                similarity[row][keep[row]])
+                         if sim >= HYBRID_MIN_SIMILARITY or int(i) in matched]
+                ranked.append(self._fuse(dense, hits))
+                for _, info in ranked[-1]:
+                    if "dense_score" in info:
+                        info["similarity"] = float(dense_similarity(info["dense_score"], higher_is_better))
+            if score_threshold is not None:
+                # Thresholding after fusion keeps the dense ranks RRF sees intact.
+                passes = (lambda s: s >= score_threshold) if higher_is_better else (lambda s: s <= score_threshold)
+                ranked = [[(i, info) for i, info in found if "dense_score" in info and passes(info["dense_score"])]
+                          for found in ranked]
+        ranked = [found[:top_k] for found in ranked]
+
+        if dedupe:
+            best = {}
+            for row, found in enumerate(ranked):
+                for faiss_id, info in found:
+                    if faiss_id not in best or info["score"] > best[faiss_id][0]:
+                        best[faiss_id] = (info["score"], row)
+            ranked = [[(i, info) for i, info in found if best[i][1] == row] for row, found in enumerate(ranked)]
+
+        return [
+            [{**metadata[faiss_id], **info} for faiss_id, info in found if faiss_id in metadata]
+            for found in ranked
+        ]
+
+    @staticmethod
+    def _fuse(dense: list, lexical: list) -> list:
+        """Reciprocal-rank fusion of two (id, score) rankings; keeps each side's raw score."""
+        fused = {}
+        for ranking, name in ((dense, "dense_score"), (lexical, "lexical_score")):
+            for rank, (faiss_id, score) in enumerate(ranking):
+                info = fused.setdefault(faiss_id, {"score": 0.0})
+                info["score"] += 1.0 / (RRF_K + rank + 1)
+                info[name] = score
+        return sorted(fused.items(), key=lambda item: -item[1]["score"])
+
+    @staticmethod
+    def _dense_hits(index, embeddings: np.ndarray, top_k: int, score_threshold: float = None):
+        """Raw FAISS results: (scores, ids, mask of hits that pass the threshold)."""
+        higher_is_better = index.metric_type == faiss.METRIC_INNER_PRODUCT
+        if higher_is_better:
+            # Inner-product indexes are built on normalized vectors (cosine similarity).
+            embeddings = np.array(embeddings, dtype="float32")
+            faiss.normalize_L2(embeddings)
+        scores, indices = index.search(embeddings, top_k)
+
+        keep = indices >= 0
+        if score_threshold is not None:
+            keep &= (scores >= score_threshold) if higher_is_better else (scores <= score_threshold)
+        return scores, indices, keep
+
+    def _search_vectors(self, state, embeddings: np.ndarray, top_k: int, score_threshold: float = None,
+                        dedupe: bool = False) -> list:
+        index, metadata = state[:2]
+        higher_is_better = index.metric_type == faiss.METRIC_INNER_PRODUCT
+        scores, indices, keep = self._dense_hits(index, embeddings, top_k, score_threshold)
+        if dedupe and keep.any():
+            rows, cols = np.nonzero(keep)
+            order = np.argsort(-scores[rows, cols] if higher_is_better else scores[rows, cols], kind="stable")
+            _, first = np.unique(indices[rows, cols][order], return_index=True)
+            best = order[first]
+            keep[:] = False
+            keep[rows[best], cols[best]] = True
+
+        results = [[] for _ in range(len(indices))]
+        for row, col in zip(*np.nonzero(keep)):
+            entry = metadata.get(int(indices[row, col]))
+            if entry is not None:
+                score = float(scores[row, col])
+                results[row].append({**entry, "score": score, "similarity": dense_similarity(score, higher_is_better)})
+        return results
+
+
+retriever = ClauseRetriever()
+
+
+def retrieve_relevant_clauses(query: str, top_k: int = 5, mode: str = None):
+    return retriever.search(query, top_k, mode=mode)
+
+
+async def aretrieve_relevant_clauses(query: str, top_k: int = 5, mode: str = None):
+    return await retriever.asearch(query, top_k, mode=mode)
+
+
+def retrieve_clauses_batch(queries: list, top_k: int = 5, score_threshold: float = None, dedupe: bool = True,
+                           mode: str = None):
+    return retriever.search_batch(queries, top_k, score_threshold, dedupe, mode)
@@ -0,0 +1,206 @@
+import os
+import re
+import threading
+import numpy as np
+
+from formatter import TITLE_PATTERN, format_sections, tag_clause
+from rag_utils import retriever
+
+# === CONFIG ===
+REVIEW_REFERENCE_K = int(os.getenv("REVIEW_REFERENCE_K", "8"))               # max store clauses per category reference
+REVIEW_MIN_SIMILARITY = float(os.getenv("REVIEW_MIN_SIMILARITY", "0.35"))   # cosine similarity to count as a match
+REVIEW_MISMATCH_MARGIN = float(os.getenv("REVIEW_MISMATCH_MARGIN", "0.1"))  # how much closer another category must be
+REVIEW_MAX_CLAUSES = int(os.getenv("REVIEW_MAX_CLAUSES", "500"))
+
+# What a clause of each `tag_clause` category is about; the base of each category's reference vector.
+REVIEW_CATEGORIES = {
+    "confidentiality": "Confidential information means all non-public information disclosed by one party "
+                       "to the other, which the recipient shall keep strictly confidential.",
+    "term": "This Agreement remains in effect for a fixed term and may be terminated by either party "
+            "upon written notice.",
+    "jurisdiction": "This Agreement is governed by the laws of the stated jurisdiction, and disputes are "
+                    "resolved by its courts.",
+    "exceptions": "The obligations do not apply to information that is public, already known, independently "
+                  "developed or lawfully received from a third party.",
+    "data_handling": "Upon termination or request, the recipient shall return or destroy all confidential "
+                     "information and copies.",
+    "signatories": "Executed by the authorized representatives of each party as of the effective date.",
+    "entire_agreement": "This Agreement constitutes the entire agreement between the parties and supersedes "
+                        "all prior understandings.",
+}
+REQUIRED_CATEGORIES = ("confidentiality", "term", "jurisdiction", "exceptions", "data_handling")
+
+
+_NUMBERING = re.compile(r'^\d+\. ')
+
+
+def _is_heading(text: str) -> bool:
+    return "\n" not in text and bool(TITLE_PATTERN.match(_NUMBERING.sub("", text)))
+
+
+def split_clauses(contract: str = None, clauses: list = None) -> list:
+    """
+    Tagged clauses from a whole contract (split with `format_sections`) or a list of clause texts.
+
+    In a formatted contract a clause title is its own section, so a heading-only
+    section is joined to the section after it and tags it.
+    """
+    if contract is not None:
+        sections, heading = [], None
+        for section in format_sections(contract):
+            if not section["text"]:
+                continue
+            if _is_heading(section["text"]):
+                if heading is not None:
+                    sections.append({"tag": tag_clause(heading), "text": heading})
+                heading = section["text"]
+                continue
+            if heading is not None:
+                tag = tag_clause(heading)
+                section = {"tag": tag if tag != "misc" else section["tag"], "text": f"{heading}\n{section['text']}"}
+                heading = None
+            sections.append(section)
+        if heading is not None:
+            sections.append({"tag": tag_clause(heading), "text": heading})
+    else:
+        sections = [{"tag": tag_clause(c.strip().split("\n")[0]), "text": c.strip()} for c in clauses if c.strip()]
+    if len(sections) > REVIEW_MAX_CLAUSES:
+        raise ValueError(f"Too many clauses ({len(sections)} > {REVIEW_MAX_CLAUSES})")
+    return sections
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# === CLAUSE REVIEWER ===
+class ClauseReviewer:
+    """
+    Semantic review of contract clauses against the clause store.
+
+    Each category gets a reference vector: the normalized mean of its
+    description and up to `reference_k` store clauses whose heading
+    `tag_clause` assigns to that category (a category the store doesn't
+    cover falls back to its description). They are built once per loaded index. A review embeds all clauses in one batched
+    encode and scores them against every reference with one matrix product.
+    """
+
+    def __init__(self, clause_retriever=retriever, reference_k: int = REVIEW_REFERENCE_K,
+                 min_similarity: float = REVIEW_MIN_SIMILARITY, mismatch_margin: float = REVIEW_MISMATCH_MARGIN):
+        self.retriever = clause_retriever
+        self.reference_k = reference_k
+        self.min_similarity = min_similarity
+        self.mismatch_margin = mismatch_margin
+        self._lock = threading.Lock()
+        self._references = None     # (index version, category names, reference matrix)
+
+    def reference_vectors(self):
+        version = self.retriever.index_version
+        references = self._references
+        if references is not None and references[0] == version:
+            return references[1], references[2]
+
+        with self._lock:
+            if self._references is None or self._references[0] != version:
+                names = list(REVIEW_CATEGORIES)
+                descriptions = [REVIEW_CATEGORIES[name] for name in names]
+                chosen = self._reference_clauses(names)
+                texts = descriptions + [text for found in chosen for text in found]
+                owners = list(range(len(names))) + [i for i, found in enumerate(chosen) for _ in found]
+
+                vectors = _normalize(self.retriever.encode(texts))
+                matrix = np.zeros((len(names), vectors.shape[1]), dtype="float32")
+                np.add.at(matrix, owners, vectors)
+                self._references = (version, names, _normalize(matrix))
+            return self._references[1], self._references[2]
+
+    def _reference_clauses(self, names: list) -> list:
+        """Per category, the texts of up to `reference_k` store clauses tagged with it by their heading."""
+        chosen = {name: [] for name in names}
+        remaining = len(names)
+        for clause in self.retriever.iter_clauses():
+            text = clause["text"].strip()
+            found = chosen.get(tag_clause(text.split("\n", 1)[0]))
+            if found is None or len(found) >= self.reference_k:
+                continue
+            found.append(text)
+            if len(found) == self.reference_k:
+                remaining -= 1
+                if not remaining:
+                    break
+        return [chosen[name] for name in names]
+
+    def review(self, clauses: list, check_missing: bool = True, embeddings: np.ndarray = None) -> dict:
+        """
+        Review tagged clauses (`format_sections` shape).
+
+        Every clause gets its category (its tag, or for untagged clauses the
+        closest category above `min_similarity`) and similarity, plus flags:
+        "low_similarity" when it reads unlike its own category and
+        "category_mismatch" when it reads clearly more like another one. With
+        `check_missing`, required categories that no clause covers are reported.
+        Pass `embeddings` to reuse vectors the caller already encoded.
+        """
+        names, references = self.reference_vectors()
+        if not clauses:
+            missing = list(REQUIRED_CATEGORIES) if check_missing else []
+            return self._result([], missing)
+
+        if embeddings is None:
+            embeddings = self.retriever.encode([c["text"] for c in clauses])
+        similarities = _normalize(embeddings) @ references.T
+        rows = np.arange(len(clauses))
+        best = similarities.argmax(axis=1)
+        best_score = similarities[rows, best]
+
+        positions = {name: i for i, name in enumerate(names)}
+        tag_index = np.array([positions.get(c["tag"], -1) for c in clauses])
+        tagged = tag_index >= 0
+        own_score = np.where(tagged, similarities[rows, np.maximum(tag_index, 0)], best_score)
+
+        low = tagged & (own_score < self.min_similarity)
+        mismatch = tagged & (best != tag_index) & (best_score - own_score > self.mismatch_margin)
+        matched = np.where(tagged, tag_index, np.where(best_score >= self.min_similarity, best, -1))
+
+        results = []
+        for i, clause in enumerate(clauses):
+            flags = [flag for flag, hit in (("low_similarity", low[i]), ("category_mismatch", mismatch[i])) if hit]
+            results.append({
+                "index": i,
+                "tag": clause["tag"],
+                "category": names[matched[i]] if matched[i] >= 0 else None,
+                "similarity": round(float(own_score[i]), 4),
+                "closest_category": names[best[i]],
+                "closest_similarity": round(float(best_score[i]), 4),
+                "flags": flags,
+                "text": clause["text"],
+            })
+
+        covered = {names[i] for i in np.unique(matched[matched >= 0])}
+        missing = [name for name in REQUIRED_CATEGORIES if name not in covered] if check_missing else []
+        return self._result(results, missing)
+
+    @staticmethod
+    def _result(results: list, missing: list) -> dict:
+        flagged = sum(1 for r in results if r["flags"])
+        problems = []
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+        if flagged:
+            problems.append(f"{flagged} flagged clause(s)")
+        return {
+            "result": "failed" if problems else "passed",
+            "comment": "; ".join(problems).capitalize() + "." if problems else "All clauses match their categories.",
+            "clauses": results,
+            "missing_categories": missing,
+            "summary": {"clauses": len(results), "flagged": flagged},
+        }
+
+
+reviewer = ClauseReviewer()
+
+
+def review_contract(contract: str = None, clauses: list = None) -> dict:
+    return reviewer.review(split_clauses(contract, clauses))
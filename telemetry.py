@@ -0,0 +1,429 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import functools
+import contextvars
+import collections
+from collections import deque
+from contextlib import contextmanager
+
+# === CONFIG ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")                        # json | text
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))          # profile requests slower than this; 0 disables
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "50000"))  # ring buffer of stack samples
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Timings of the current request: {stage: seconds}, shared with worker threads
+# (asyncio.to_thread copies the context, and with it a reference to this dict).
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+_request_id = contextvars.ContextVar("request_id", default=None)
+_REQUEST_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")   # client ids outside this are replaced (they name profile files)
+
+
+# === STRUCTURED LOGGING ===
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields and the request id are included as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = _request_id.get()
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development: `level logger: msg key=value ...`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}" + (f" {fields}" if fields else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+_logging_configured = False
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Attach one stderr handler to the "accordly" logger tree (idempotent)."""
+    global _logging_configured
+    root = logging.getLogger("accordly")
+    root.setLevel(level)
+    if not _logging_configured:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        root.addHandler(handler)
+        root.propagate = False
+        _logging_configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"accordly.{name}")
+
+
+log = get_logger("telemetry")
+
+
+# === METRICS ===
+def _label_string(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [f"{self.name}_total{_label_string(self.labelnames, k)} {v:g}" for k, v in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, rendered in the Prometheus text format.
+
+    Each label set keeps per-bucket counts plus a running sum and count, so an
+    observation is a short scan over the buckets under a lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> list:
+        lines = []
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), values[:-2] + [values[-1] - sum(values[:-2])]):
+                cumulative += count
+                le = 'le="%s"' % ("+Inf" if bound is None else f"{bound:g}")
+                lines.append(f"{self.name}_bucket{_label_string(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_string(self.labelnames, key)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_label_string(self.labelnames, key)} {values[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics plus collector callbacks (for gauges read from existing `stats()`)."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """`collect()` returns {metric name: value} gauges, read at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in self._collectors:
+            try:
+                gauges = collect()
+            except Exception as e:
+                log.warning("metrics collector failed", extra={"error": str(e)})
+                continue
+            for name, value in gauges.items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram("accordly_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+request_seconds = registry.histogram("accordly_request_seconds", "HTTP request latency, until the last body byte.",
+                                     ("method", "route", "status"))
+
+
+# === STAGE TIMERS ===
+def record(name: str, seconds: float):
+    """Record a stage duration in the histogram and in the current request's breakdown."""
+    stage_seconds.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as pipeline stage `name`. Stages may nest; a repeated stage is summed per request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def timed(name: str):
+    """Decorator form of `stage` for plain and async functions."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def server_timing(timings: dict, total: float = None) -> str:
+    """`Server-Timing` header value, durations in milliseconds."""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# === SAMPLING PROFILER ===
+_IDLE_LEAVES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+                ("telemetry.py", "_run")}
+
+
+class SamplingProfiler:
+    """
+    Opt-in wall-clock sampler for slow requests.
+
+    While at least one request is in flight, a daemon thread snapshots every
+    thread's stack each `interval` seconds into a ring buffer. When a request
+    takes longer than `slow_ms`, the samples from its time window are folded
+    into `{"file:func;file:func;...": count}` (flame graph input) and passed to
+    the slow-request hooks. Samples are process-wide, so with concurrent
+    requests a profile also contains the others' work.
+    """
+
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, interval: float = PROFILE_INTERVAL,
+                 max_samples: int = PROFILE_MAX_SAMPLES):
+        self.slow_ms = slow_ms
+        self.interval = interval
+        self._samples = deque(maxlen=max_samples)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._hooks = []
+        self.profiles = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0
+
+    def add_hook(self, hook):
+        """`hook(request: dict, folded: Counter)` is called from a worker thread after each slow request."""
+        self._hooks.append(hook)
+
+    def begin(self):
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, request: dict, started: float, duration: float):
+        """Finish a request started at `started` (time.monotonic()); slow ones are profiled in a thread."""
+        with self._lock:
+            self._active -= 1
+        if duration * 1000 >= self.slow_ms:
+            threading.Thread(target=self._profile, args=(request, started), daemon=True).start()
+
+    def _profile(self, request: dict, started: float):
+        folded = collections.Counter(s for t, s in list(self._samples) if t >= started)
+        if not folded:
+            return
+        self.profiles += 1
+        for hook in self._hooks:
+            try:
+                hook(request, folded)
+            except Exception as e:
+                log.warning("slow request hook failed", extra={"error": str(e)})
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            now = time.monotonic()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    folded = self._fold(frame)
+                    if folded:
+                        self._samples.append((now, folded))
+
+    @staticmethod
+    def _fold(frame, max_depth: int = 64) -> str:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+            return ""
+        names = []
+        while frame is not None and len(names) < max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+def write_folded_profile(request: dict, folded: collections.Counter):
+    """Default slow-request hook: write the folded stacks to PROFILE_DIR and log the path."""
+    request_id = request["request_id"] if _REQUEST_ID.fullmatch(request["request_id"]) else uuid.uuid4().hex[:16]
+    directory = os.path.realpath(PROFILE_DIR)
+    path = os.path.realpath(os.path.join(directory, f"{time.strftime('%Y%m%d_%H%M%S')}_{request_id}.folded"))
+    if os.path.dirname(path) != directory:
+        raise ValueError(f"Profile path escapes {PROFILE_DIR}: {path}")
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in folded.most_common():
+            f.write(f"{stack} {count}\n")
+    log.warning("slow request profiled", extra={**request, "profile": path, "samples": sum(folded.values())})
+
+
+profiler = SamplingProfiler()
+profiler.add_hook(write_folded_profile)
+
+
+# === ASGI MIDDLEWARE ===
+class TelemetryMiddleware:
+    """
+    Per-request timing for HTTP requests.
+
+    Sets a request id (the client's `X-Request-ID`, or a new one) for logs,
+    collects stage timings into a `Server-Timing` header, and records the
+    request latency histogram when the last body byte is sent. Streaming
+    responses send headers first, so their header only covers the stages that
+    finished before the first byte; the histograms cover the whole stream.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not _REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex[:16]
+        timings = {}
+        timings_token = _request_timings.set(timings)
+        id_token = _request_id.set(request_id)
+        started = time.perf_counter()
+        started_monotonic = time.monotonic()
+        status = [500]
+        finished = [False]
+        if self.profiler.enabled:
+            self.profiler.begin()
+
+        def complete():
+            if finished[0]:
+                return
+            finished[0] = True
+            duration = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_seconds.observe(duration, method=scope["method"], route=route, status=status[0])
+            if self.profiler.enabled:
+                info = {"request_id": request_id, "method": scope["method"], "route": route,
+                        "status": status[0], "duration_ms": round(duration * 1000, 1)}
+                self.profiler.end(info, started_monotonic, duration)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                extra = [(b"x-request-id", request_id.encode("latin-1")),
+                         (b"server-timing", server_timing(timings, time.perf_counter() - started).encode("latin-1"))]
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                complete()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            complete()
+            _request_timings.reset(timings_token)
+            _request_id.reset(id_token)
+
+
+def metrics_text() -> str:
+    return registry.render()
@@ -0,0 +1,184 @@
+import os
+import json
+import asyncio
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from artifact_store import ArtifactStore
+from formatter import tag_clause
+from rag_indexer import CHUNK_SIZE, chunk_text
+from rag_utils import BASE_DIR, retriever
+from review_engine import REQUIRED_CATEGORIES, reviewer
+from utils import count_pages, extract_pages
+
+# === CONFIG ===
+UPLOAD_EXTENSIONS = (".pdf", ".docx", ".txt")
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "50"))
+UPLOAD_EXTRACT_WORKERS = int(os.getenv("UPLOAD_EXTRACT_WORKERS", "2"))   # extraction processes shared by uploads
+UPLOAD_PAGE_BATCH = int(os.getenv("UPLOAD_PAGE_BATCH", "8"))             # pages per worker task
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join(BASE_DIR, "data", "text_cache"))
+TEXT_CACHE_MAX_MB = float(os.getenv("TEXT_CACHE_MAX_MB", "256"))
+TEXT_CACHE_MAX_AGE = float(os.getenv("TEXT_CACHE_MAX_AGE", str(7 * 86400)))  # seconds
+
+SPOOL_READ_SIZE = 1 << 20
+
+# Extracted pages keyed by the sha256 of the uploaded file.
+text_cache = ArtifactStore(TEXT_CACHE_DIR, int(TEXT_CACHE_MAX_MB * 2 ** 20), TEXT_CACHE_MAX_AGE)
+
+_pool = None
+
+
+def _extract_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=UPLOAD_EXTRACT_WORKERS)
+    return _pool
+
+
+def shutdown_extract_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _spool_chunk(f, digest, data: bytes):
+    digest.update(data)
+    f.write(data)
+
+
+async def spool_upload(upload) -> tuple:
+    """
+    Copy an upload to a temp file in fixed-size reads, hashing as it goes.
+
+    Hashing and writing each chunk run in a worker thread, off the event loop.
+
+    Returns (path, sha256). The caller removes the file. Raises ValueError for
+    unsupported extensions or files over UPLOAD_MAX_MB.
+    """
+    ext = os.path.splitext(upload.filename or "")[1].lower()
+    if ext not in UPLOAD_EXTENSIONS:
+        raise ValueError(f"Unsupported file format: {ext or 'unknown'}")
+
+    limit = int(UPLOAD_MAX_MB * 2 ** 20)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=ext, prefix="upload_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                data = await upload.read(SPOOL_READ_SIZE)
+                if not data:
+                    break
+                size += len(data)
+                if size > limit:
+                    raise ValueError(f"File is larger than {UPLOAD_MAX_MB:g} MB")
+                await asyncio.to_thread(_spool_chunk, f, digest, data)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+async def _extracted_pages(path: str, sha256: str):
+    """
+    Yield pages as worker processes extract them, then cache the text.
+
+    PDFs are extracted in page batches, one batch ahead. DOCX and TXT have no
+    page index to seek to, so each is extracted from one parse in one task.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _extract_pool()
+    if os.path.splitext(path)[1].lower() == ".pdf":
+        total = await loop.run_in_executor(pool, count_pages, path)
+        ranges = [(start, min(start + UPLOAD_PAGE_BATCH, total)) for start in range(0, total, UPLOAD_PAGE_BATCH)]
+    else:
+        ranges = [(0, None)]
+
+    pages = []
+    pending = loop.run_in_executor(pool, extract_pages, path, *ranges[0]) if ranges else None
+    for i in range(len(ranges)):
+        batch = await pending
+        if i + 1 < len(ranges):
+            pending = loop.run_in_executor(pool, extract_pages, path, *ranges[i + 1])
+        for text in batch:
+            pages.append(text)
+            yield text
+
+    await asyncio.to_thread(text_cache.put, sha256, json.dumps(pages, ensure_ascii=False).encode("utf-8"))
+
+
+def _review_chunks(chunks: list) -> tuple:
+    """Tag, review and match a batch of chunks with one encode."""
+    clauses = [{"tag": tag_clause(chunk.split("\n")[0]), "text": chunk} for chunk in chunks]
+    embeddings = retriever.encode(chunks)
+    review = reviewer.review(clauses, check_missing=False, embeddings=embeddings)
+    matches = retriever.search_embeddings(embeddings, 1)
+    return review["clauses"], matches
+
+
+async def stream_upload_review(path: str, sha256: str, filename: str = ""):
+    """
+    Review an uploaded contract as its text is extracted, as NDJSON lines.
+
+    Pages are chunked with `chunk_text` as they arrive (the last chunk of a
+    page is carried over, since the clause may continue on the next page).
+    Each page's chunks are tagged, reviewed and matched to the closest store
+    clause in one batch. Extracted text is cached by file hash. Events: "file",
+    one "chunk" per chunk, then "summary" with the missing categories.
+    The temp file at `path` is removed when the stream ends.
+    """
+    try:
+        cached = await asyncio.to_thread(text_cache.get, sha256)
+        yield json.dumps({"event": "file", "filename": filename, "sha256": sha256, "cached": cached is not None}) + "\n"
+
+        if cached is not None:
+            async def cached_pages():
+                for text in json.loads(cached):
+                    yield text
+            source = cached_pages()
+        else:
+            source = _extracted_pages(path, sha256)
+
+        covered = set()
+        counts = {"pages": 0, "chunks": 0, "flagged": 0}
+        carry = ""
+
+        async def review(chunks: list, page: int):
+            results, matches = await asyncio.to_thread(_review_chunks, chunks)
+            lines = []
+            for result, found in zip(results, matches):
+                if result["category"]:
+                    covered.add(result["category"])
+                counts["flagged"] += bool(result["flags"])
+                closest = found[0] if found else None
+                lines.append(json.dumps({
+                    "event": "chunk",
+                    **result,
+                    "index": counts["chunks"],
+                    "page": page,
+                    "closest_clause": {"id": closest.get("id"), "score": closest["score"]} if closest else None,
+                }, ensure_ascii=False) + "\n")
+                counts["chunks"] += 1
+            return "".join(lines)
+
+        async for text in source:
+            counts["pages"] += 1
+            chunks = chunk_text(f"{carry}\n{text}" if carry else text, CHUNK_SIZE)
+            chunks, carry = [c for c in chunks[:-1] if c], chunks[-1] if chunks else ""
+            if chunks:
+                yield await review(chunks, counts["pages"])
+        if carry:
+            yield await review([carry], counts["pages"])
+
+        missing = [name for name in REQUIRED_CATEGORIES if name not in covered]
+        yield json.dumps({"event": "summary", **counts, "missing_categories": missing}) + "\n"
+    except Exception as e:
+        # Headers are already sent, so failures are reported in-band.
+        yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,22 +1,70 @@
 # utils.py
 import os
+from itertools import islice
 from docx import Document
 from PyPDF2 import PdfReader
 
-def extract_text_from_file(file_path: str) -> str:
+DOCX_PARAGRAPHS_PER_PAGE = 40   # DOCX has no stored pages; extraction yields blocks of paragraphs
+TXT_LINES_PER_PAGE = 50
+
+
+def _blocks(lines, size: int):
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) == size:
+            yield "\n".join(block)
+            block = []
+    if block:
+        yield "\n".join(block)
+
+
+def _split_lines(f):
+    """Lines of a text file without their newline; like `f.read().split("\\n")`, without reading it whole."""
+    line = ""
+    for line in f:
+        yield line[:-1] if line.endswith("\n") else line
+    if not line or line.endswith("\n"):
+        yield ""
+
+
+def iter_text_pages(file_path: str, start: int = 0, stop: int = None):
+    """
+    Yield the text of a file page by page (paragraph/line blocks for DOCX and TXT).
+
+    The file is parsed once and pages are produced lazily, so take every page
+    you need from one call rather than calling again per range.
+    """
     ext = os.path.splitext(file_path)[1].lower()
 
     if ext == ".txt":
         with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
+            yield from islice(_blocks(_split_lines(f), TXT_LINES_PER_PAGE), start, stop)
 
     elif ext == ".docx":
         doc = Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs])
+        yield from islice(_blocks((p.text for p in doc.paragraphs), DOCX_PARAGRAPHS_PER_PAGE), start, stop)
 
     elif ext == ".pdf":
         reader = PdfReader(file_path)
-        return "\n".join([page.extract_text() or "" for page in reader.pages])
+        for page in reader.pages[start:stop]:
+            yield page.extract_text() or ""
 
     else:
         raise ValueError(f"Unsupported file format: {ext}")
+
+
+def count_pages(file_path: str) -> int:
+    """Page count; cheap for PDFs, a full parse for DOCX and TXT."""
+    if os.path.splitext(file_path)[1].lower() == ".pdf":
+        return len(PdfReader(file_path).pages)
+    return sum(1 for _ in iter_text_pages(file_path))
+
+
+def extract_pages(file_path: str, start: int, stop: int) -> list:
+    """Pages `start`..`stop` of a file; a picklable entry point for worker processes."""
+    return list(iter_text_pages(file_path, start, stop))
+
+
+def extract_text_from_file(file_path: str) -> str:
+    return "\n".join(iter_text_pages(file_path))